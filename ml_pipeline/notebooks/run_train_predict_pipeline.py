@@ -294,8 +294,14 @@ def save_parameters_for_monthly_training(run_manager: RunManager, parameters: di
     logger.info(f"💾 Saved training parameters to: {params_file}")
     return params_file
 
-def generate_composites(run_id: str, year: str, db_host: str = "local", forest_algorithm: str = "majority_vote"):
-    """Generate annual composites from monthly predictions."""
+def generate_composites(run_id: str, year: str, db_host: str = "local", forest_algorithm: str = "majority_vote",
+                        n_jobs: Optional[int] = None):
+    """Generate annual composites from monthly predictions.
+
+    Quads are independent, so they are spread over *n_jobs* worker
+    processes (default: half the CPUs – each quad already reads its months
+    on a thread pool).
+    """
     logger.info("\n🧩 Generating annual composites...")
     logger.info(f"🔬 Using forest flag algorithm: {forest_algorithm}")
     
@@ -321,8 +327,13 @@ def generate_composites(run_id: str, year: str, db_host: str = "local", forest_a
         logger.info(f"📍 Extracted {len(quads)} unique quads from local files")
         logger.info(f"🔍 Example quads: {quads[:4] if len(quads) >= 4 else quads}")
         
-        # Generate composites in parallel (limited to avoid overwhelming storage)  
-        results = Parallel(n_jobs=2, prefer="processes")(
+        # Generate composites in parallel – one process per quad, each with its
+        # own temp dir (CompositeGenerator context) and its own S3 client
+        if n_jobs is None:
+            n_jobs = max(1, (os.cpu_count() or 2) // 2)
+        n_jobs = max(1, min(n_jobs, len(quads)))
+        logger.info(f"⚙️  Generating composites on {n_jobs} worker processes")
+        results = Parallel(n_jobs=n_jobs, prefer="processes")(
             delayed(process_quad_with_local)(quad_name=quad, run_id=run_id, year=year, forest_algorithm=forest_algorithm)
             for quad in tqdm(quads, desc="Generating composites")
         )
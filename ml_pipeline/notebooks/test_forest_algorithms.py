@@ -70,12 +70,15 @@ def test_algorithms():
     
     results = {}
     
+    # Mask the stack once and run every algorithm on it
+    all_flags = generator._generate_forest_flags(stacked, algorithms)
+    
     for algorithm in algorithms:
         print(f"\nTesting algorithm: {algorithm}")
         print("-" * 40)
         
         try:
-            forest_flag = generator._generate_forest_flag(stacked, algorithm)
+            forest_flag = all_flags[algorithm]
             results[algorithm] = forest_flag
             
             # Check results for each test case
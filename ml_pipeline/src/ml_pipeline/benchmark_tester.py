@@ -1,12 +1,15 @@
 from __future__ import annotations
 
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Set
 import logging
 
+import geopandas as gpd
 import numpy as np
 import pandas as pd
-from sklearn.metrics import accuracy_score, classification_report
+from tqdm import tqdm
 
 from ml_pipeline.extractor import TitilerExtractor
 from ml_pipeline.polygon_loader import load_training_polygons
@@ -16,7 +19,7 @@ from ml_pipeline.benchmark_metrics_io import (
     plot_accuracy,
 )
 from ml_pipeline.db_utils import get_db_connection
-from ml_pipeline.raster_utils import extract_pixels_with_missing
+from ml_pipeline.raster_utils import CogDatasetCache, extract_cog_group, group_geometries_by_cog
 
 # Suppress boto3 logging
 logging.getLogger('boto3').setLevel(logging.WARNING)
@@ -24,6 +27,77 @@ logging.getLogger('botocore').setLevel(logging.WARNING)
 logging.getLogger('s3transfer').setLevel(logging.WARNING)
 logging.getLogger('urllib3').setLevel(logging.WARNING)
 
+# Integer label encoding shared by the ground truth and the predictions
+_LABEL_CODES = {"Non-Forest": 0, "Forest": 1}
+
+# Schema of the metrics frame returned by BenchmarkTester.run (column order
+# is the CSV column order)
+_METRIC_DTYPES = {
+    "run_id": object,
+    "collection": object,
+    "month": object,
+    "n_polygons": np.int64,
+    "n_pixels": np.int64,
+    "accuracy": np.float64,
+    "f1_forest": np.float64,
+    "f1_nonforest": np.float64,
+    "precision_forest": np.float64,
+    "precision_nonforest": np.float64,
+    "recall_forest": np.float64,
+    "recall_nonforest": np.float64,
+    "missing_pct": np.float64,
+}
+_METRIC_COLS = tuple(_METRIC_DTYPES)
+
+
+@lru_cache(maxsize=64)
+def _read_held_out(csv_path: str, mtime_ns: int) -> pd.DataFrame:
+    """Held-out feature IDs from *csv_path* as a one-column ``id`` frame (str).
+
+    *mtime_ns* is only part of the cache key, so a rewritten CSV is re-read.
+    """
+    feature_df = pd.read_csv(csv_path, usecols=["feature_id"], dtype={"feature_id": str})
+    return feature_df.rename(columns={"feature_id": "id"}).drop_duplicates()
+
+
+def _count_pixels(pixels: np.ndarray) -> tuple[int, int]:
+    """Return ``(forest, valid)`` pixel counts for pre-processed raster values.
+
+    1 = Forest, 0 = Non-Forest, 255 = Missing (not valid). Any other value is
+    a valid Non-Forest prediction.
+    """
+    flat = pixels.ravel()
+    if flat.dtype == np.uint8:
+        # One histogram pass instead of two comparisons + boolean temporaries
+        hist = np.bincount(flat, minlength=256)
+        return int(hist[1]), int(flat.size - hist[255])
+    return int(np.count_nonzero(flat == 1)), int(np.count_nonzero(flat != 255))
+
+
+def _confusion_metrics(cms: np.ndarray) -> Dict[str, np.ndarray]:
+    """Vectorised accuracy / precision / recall / F1 from stacked 2×2 matrices.
+
+    *cms* has shape ``(n, 2, 2)`` indexed as ``[true, pred]`` with
+    0 = Non-Forest and 1 = Forest. Mirrors sklearn's ``zero_division=0``.
+    """
+    cms = cms.astype(np.float64)
+    tn, fp = cms[:, 0, 0], cms[:, 0, 1]
+    fn, tp = cms[:, 1, 0], cms[:, 1, 1]
+
+    def _div(num, den):
+        return np.divide(num, den, out=np.zeros_like(num), where=den > 0)
+
+    return {
+        "accuracy": _div(tp + tn, tn + fp + fn + tp),
+        "f1_forest": _div(2 * tp, 2 * tp + fp + fn),
+        "f1_nonforest": _div(2 * tn, 2 * tn + fn + fp),
+        "precision_forest": _div(tp, tp + fp),
+        "precision_nonforest": _div(tn, tn + fn),
+        "recall_forest": _div(tp, tp + fn),
+        "recall_nonforest": _div(tn, tn + fp),
+    }
+
+
 class BenchmarkTester:
     """Run inference against a (raster) benchmark dataset and capture metrics.
     
@@ -70,6 +144,17 @@ class BenchmarkTester:
     - missing_pct: Percentage of pixels with missing/nodata values
     """
 
+    # Training polygons keyed by (database URL, project_id, month, feature_ids)
+    # – shared by every tester in the process so sweeps across collections hit
+    # the DB once. The oldest entries are dropped past _POLY_CACHE_MAX; call
+    # clear_caches() to pick up polygons edited since they were loaded.
+    _poly_cache: Dict[tuple, gpd.GeoDataFrame] = {}
+    _POLY_CACHE_MAX = 64
+    # (db_host, collection) pairs that passed the fail-fast COG check, so the
+    # check runs once per collection. Failed checks are not remembered, so a
+    # collection loaded after a failure is picked up.
+    _checked_collections: Set[tuple] = set()
+
     # ------------------------------------------------------------------
     # Construction helpers
     # ------------------------------------------------------------------
@@ -85,6 +170,7 @@ class BenchmarkTester:
         test_features_dir: str | Path | None = None,
         db_host: str = "local",
         verbose: bool = False,
+        max_workers: int = 16,
     ) -> None:
         """Parameters
         ----------
@@ -111,14 +197,21 @@ class BenchmarkTester:
             production database (defaults to "local").
         verbose
             Enable verbose logging for pixel extraction (defaults to False).
+        max_workers
+            Threads used to extract polygons concurrently. Extraction is
+            network-bound (remote COG reads), so this can exceed the CPU count
+            (defaults to 16).
         """
         self.collection = collection
         self.year = str(year)
         self.project_id = project_id
         self.band_indexes = band_indexes or [1]
         self.engine = engine or get_db_connection(host=db_host)
+        # Identifies the database in the polygon cache key (password masked)
+        self._db_key = str(getattr(self.engine, "url", db_host))
         self.run_id = run_id
         self.verbose = verbose
+        self.max_workers = max_workers
 
         # Where are the held-out feature-ID CSVs?
         if test_features_dir is not None:
@@ -136,9 +229,87 @@ class BenchmarkTester:
         )
 
         # Quick fail-fast – does the collection exist?
-        _cogs = self.extractor.get_all_cog_urls(collection)
-        if len(_cogs) == 0:
-            raise ValueError(f"No COGs found for collection '{collection}'. Is the STAC loaded?")
+        key = (db_host, collection)
+        if key not in BenchmarkTester._checked_collections:
+            _cogs = self.extractor.get_all_cog_urls(collection)
+            if len(_cogs) == 0:
+                raise ValueError(f"No COGs found for collection '{collection}'. Is the STAC loaded?")
+            BenchmarkTester._checked_collections.add(key)
+
+    def _get_polys(
+        self, project_id: int, month: str, feature_ids: frozenset | None = None
+    ) -> gpd.GeoDataFrame:
+        """Return training polygons for *month*, loading them at most once per process.
+
+        *feature_ids* restricts the load to those features (pushed into SQL) and
+        is part of the cache key.
+        """
+        key = (self._db_key, project_id, month, feature_ids)
+        gdf = BenchmarkTester._poly_cache.get(key)
+        if gdf is None:
+            gdf = load_training_polygons(
+                self.engine,
+                project_id=project_id,
+                basemap_date=month,
+                feature_ids=sorted(feature_ids) if feature_ids is not None else None,
+            )
+            self._cache_polys(key, gdf)
+        return gdf
+
+    def _prefetch_polys(
+        self, project_id: int, months: List[str], feature_ids: frozenset | None = None
+    ) -> None:
+        """Load every uncached month of *months* with a single SQL query."""
+        missing = [
+            m for m in months
+            if (self._db_key, project_id, m, feature_ids) not in BenchmarkTester._poly_cache
+        ]
+        if not missing:
+            return
+        gdf_all = load_training_polygons(
+            self.engine,
+            project_id=project_id,
+            basemap_dates=missing,
+            feature_ids=sorted(feature_ids) if feature_ids is not None else None,
+        )
+        by_month = dict(tuple(gdf_all.groupby("basemap_date"))) if not gdf_all.empty else {}
+        for m in missing:
+            self._cache_polys((self._db_key, project_id, m, feature_ids), by_month.get(m, gdf_all.iloc[0:0]))
+
+    @staticmethod
+    def _cache_polys(key: tuple, gdf: gpd.GeoDataFrame) -> None:
+        """Store *gdf* under *key*, dropping the oldest entries past the size limit."""
+        cache = BenchmarkTester._poly_cache
+        cache[key] = gdf
+        while len(cache) > BenchmarkTester._POLY_CACHE_MAX:
+            cache.pop(next(iter(cache)))
+
+    @classmethod
+    def clear_caches(cls) -> None:
+        """Forget cached polygons, checked collections and held-out CSVs.
+
+        Use after editing training polygons or loading a collection in a
+        long-running session.
+        """
+        cls._poly_cache.clear()
+        cls._checked_collections.clear()
+        _read_held_out.cache_clear()
+
+    def _held_out_ids(self, months: List[str]) -> frozenset | None:
+        """Union of the held-out feature IDs over *months*.
+
+        ``None`` (load everything) when there is no held-out directory or a
+        month's CSV is missing – the month loop reports that case.
+        """
+        if self.test_features_dir is None:
+            return None
+        ids: set = set()
+        for month in months:
+            csv_path = self.test_features_dir / f"test_features_{month}.csv"
+            if not csv_path.exists():
+                return None
+            ids.update(_read_held_out(str(csv_path), csv_path.stat().st_mtime_ns)["id"])
+        return frozenset(ids)
 
     # ------------------------------------------------------------------
     # Public API
@@ -148,28 +319,41 @@ class BenchmarkTester:
 
         Set *save* to ``False`` if you do **not** want the CSV + quick-look tables.
         """
-        metrics_rows: List[Dict] = []
-        y_true_all, y_pred_all = [], []
+        # Per-month 2×2 [true, pred] counts (0=Non-Forest, 1=Forest). Memory stays
+        # constant in the number of pixels – only counts are kept.
+        cms = np.zeros((12, 2, 2), dtype=np.int64)
+        months_done: List[str] = []
+        done_idx: List[int] = []
+        n_polygons: List[int] = []
+        missing_pcts: List[float] = []
         missing_total = 0              # missing pixels across all months
         total_pixels_all = 0           # valid + missing pixels across all months
         total_polygons_considered = 0
 
         # One pass over every month that has polygons
-        months_sorted = [f"{m:02d}" for m in range(1, 13)]
-        for month_str in months_sorted:
-            month = f"{self.year}-{month_str}"
+        year_months = [f"{self.year}-{m:02d}" for m in range(1, 13)]
+        # Held-out IDs are pushed into the polygon query so only test features
+        # are fetched and parsed
+        feature_ids = self._held_out_ids(year_months)
+        try:
+            self._prefetch_polys(self.project_id, year_months, feature_ids)
+        except Exception as e:
+            raise RuntimeError(
+                f"❌  Failed to load polygons for {self.year}-01 – {self.year}-12: {e}. "
+                "This likely means the training-polygon table is incomplete "
+                "or the SQL query needs updating."
+            ) from e
+        # ------------------------------------------------------------------
+        # Load training polygons for every month & filter by the held-out set
+        # ------------------------------------------------------------------
+        month_jobs = []  # (m_idx, month, geoms, true_codes, n_polys)
+        cog_tasks = []   # (m_idx, cog, polygon indexes) across all months
+        for m_idx, month in enumerate(year_months):
             print("-" * 100)
             print(f"Processing {month}")
 
-            # ------------------------------------------------------------------
-            # Load training polygons for this month & filter by the held-out set
-            # ------------------------------------------------------------------
             try:
-                gdf_month = load_training_polygons(
-                    self.engine,
-                    project_id=self.project_id,
-                    basemap_date=month,
-                )
+                gdf_month = self._get_polys(self.project_id, month, feature_ids)
             except Exception as e:
                 raise RuntimeError(
                     f"❌  Failed to load polygons for {month}: {e}. "
@@ -190,9 +374,8 @@ class BenchmarkTester:
             if self.test_features_dir is not None:
                 csv_path = self.test_features_dir / f"test_features_{month}.csv"
                 if csv_path.exists():
-                    feature_df = pd.read_csv(csv_path)
-                    held_out_ids = set(feature_df["feature_id"].astype(str))
-                    gdf_month = gdf_month[gdf_month["id"].isin(held_out_ids)]
+                    held_out = _read_held_out(str(csv_path), csv_path.stat().st_mtime_ns)
+                    gdf_month = gdf_month.astype({"id": str}).merge(held_out, on="id", how="inner")
                     print(f"Held-out polygons: {len(gdf_month)}")
                 else:
                     raise FileNotFoundError(
@@ -204,139 +387,113 @@ class BenchmarkTester:
                     f"❌  All polygons were filtered out for {month} after applying the held-out IDs."
                 )
 
-            # ------------------------------------------------------------------
-            # Extract pixels & classify for each polygon
-            # ------------------------------------------------------------------
-            # IMPORTANT: We perform PIXEL-LEVEL evaluation, not polygon-level.
-            # Each pixel within a polygon is individually compared against that 
-            # polygon's ground truth label. No aggregation/majority voting is done.
-            pixel_predictions = []  # Store individual pixel predictions
-            total_missing_px = 0
-            
-            for idx, row in gdf_month.iterrows():
+            # Count polygons once, before any per-pixel expansion of the frame
+            n_polys_this_month = len(gdf_month)
+
+            # Group polygons by the COG(s) they intersect so each COG is opened
+            # and read once per month instead of once per polygon
+            geoms = gdf_month.geometry.to_numpy()
+            true_codes = gdf_month["classLabel"].map(_LABEL_CODES).to_numpy(dtype=np.int8)
+            cog_groups = group_geometries_by_cog(self.extractor, geoms)
+            if self.verbose:
+                print(f"{n_polys_this_month} polygons across {len(cog_groups)} COGs")
+
+            month_jobs.append((m_idx, month, geoms, true_codes, n_polys_this_month))
+            cog_tasks.extend((m_idx, cog, idx) for cog, idx in cog_groups.items())
+
+        # ------------------------------------------------------------------
+        # Extract pixels & classify for each polygon
+        # ------------------------------------------------------------------
+        # IMPORTANT: We perform PIXEL-LEVEL evaluation, not polygon-level.
+        # Each pixel within a polygon is individually compared against that 
+        # polygon's ground truth label. No aggregation/majority voting is done.
+        #
+        # Months are independent, so the COG groups of all twelve share one
+        # pool – no month waits for the slowest quad of the previous one. The
+        # biggest groups go first so a large quad does not end up running
+        # alone at the tail of the pool.
+        missing_by_month = np.zeros(12, dtype=np.int64)
+        cog_tasks.sort(key=lambda task: len(task[2]), reverse=True)
+        # COG handles stay open for the whole run – months revisit the same quads
+        with CogDatasetCache() as datasets, ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {
+                pool.submit(
+                    extract_cog_group, cog, month_jobs[m_idx][2][idx], self.band_indexes, datasets=datasets
+                ): (m_idx, cog, idx)
+                for m_idx, cog, idx in cog_tasks
+            }
+            for future in tqdm(as_completed(futures), total=len(futures), desc=f"Extracting {self.year}"):
+                m_idx, cog, idx = futures[future]
                 try:
-                    pixels, missing_px, _ = extract_pixels_with_missing(self.extractor, row.geometry, self.band_indexes, verbose=self.verbose)
-                    total_missing_px += missing_px
-                    
-                    if pixels.size > 0:
-                        # Handle pre-processed raster values: 1=Forest, 0=Non-Forest, 255=Missing
-                        pixels_flat = pixels.squeeze()
-                        # Filter out missing data (255)
-                        valid_pixels = pixels_flat[pixels_flat != 255]
-                        
-                        if len(valid_pixels) > 0:
-                            # Convert pixel values to labels: 1 -> "Forest", 0 -> "Non-Forest"
-                            predicted_labels = ["Forest" if px == 1 else "Non-Forest" for px in valid_pixels]
-                            
-                            # Store each individual pixel prediction with polygon's true label
-                            # This creates one entry per pixel, allowing pixel-level accuracy assessment
-                            polygon_true_label = row["classLabel"]
-                            for predicted_label in predicted_labels:
-                                pixel_predictions.append({
-                                    "polygon_id": str(row["id"]),
-                                    "true_label": polygon_true_label,  # Polygon's ground truth
-                                    "predicted_label": predicted_label  # Individual pixel prediction
-                                })
-                        else:
-                            # All pixels are missing data, skip this polygon
-                            continue
+                    results = future.result()
                 except Exception as e:
-                    print(f"  ⚠️  Failed to extract pixels for polygon {row['id']}: {e}")
+                    print(f"  ⚠️  Failed to extract pixels from {cog} ({year_months[m_idx]}): {e}")
                     continue
-            
-            if not pixel_predictions:
+
+                true_codes = month_jobs[m_idx][3]
+                for poly_idx, (pixels, missing_px) in zip(idx, results):
+                    missing_by_month[m_idx] += missing_px
+
+                    # Handle pre-processed raster values: 1=Forest, 0=Non-Forest, 255=Missing.
+                    # Every pixel inherits the polygon's ground-truth label, which keeps
+                    # the assessment at pixel level; only the counts are kept.
+                    forest_count, valid_count = _count_pixels(pixels)
+                    true_code = true_codes[poly_idx]
+                    cms[m_idx, true_code, 1] += forest_count
+                    cms[m_idx, true_code, 0] += valid_count - forest_count
+
+        for m_idx, month, _, _, n_polys_this_month in month_jobs:
+            valid_px = int(cms[m_idx].sum())  # Number of individual pixel predictions
+            if valid_px == 0:
                 raise RuntimeError(
                     f"❌  No valid predictions extracted for {month}. Check if the raster has coverage "
                     "or if all pixels are nodata."
                 )
 
-            # Convert to DataFrame for easier processing
-            pixel_df = pd.DataFrame(pixel_predictions)
-            
-            missing_px = total_missing_px
+            missing_px = int(missing_by_month[m_idx])
 
             # Pixel-based missing-data metric
-            valid_px = len(pixel_predictions)  # Number of individual pixel predictions
             missing_px_pct = missing_px / (missing_px + valid_px) if (missing_px + valid_px) else 0.0
             print(
-                f"Pixel-level missing data: {missing_px} missing vs {valid_px} valid "
+                f"{month} pixel-level missing data: {missing_px} missing vs {valid_px} valid "
                 f"({missing_px_pct:.2%})"
             )
 
             # Track global counts
             missing_total += missing_px
             total_pixels_all += (missing_px + valid_px)
-            total_polygons_considered += len(gdf_month)
-
-            # ------------------------------------------------------------------
-            # Calculate metrics based on individual pixels
-            # ------------------------------------------------------------------
-            y_true = pixel_df["true_label"]
-            y_pred_valid = pixel_df["predicted_label"]
-
-            acc = accuracy_score(y_true, y_pred_valid)
-            report = classification_report(
-                y_true,
-                y_pred_valid,
-                labels=["Forest", "Non-Forest"],
-                output_dict=True,
-                zero_division=0,
-            )
+            total_polygons_considered += n_polys_this_month
 
-            metrics_rows.append(
-                {
-                    "run_id": self.run_id,
-                    "collection": self.collection,
-                    "month": month,
-                    "n_polygons": len(gdf_month),
-                    "n_pixels": len(y_pred_valid),
-                    "accuracy": acc,
-                    "f1_forest": report["Forest"]["f1-score"],
-                    "f1_nonforest": report["Non-Forest"]["f1-score"],
-                    "precision_forest": report["Forest"]["precision"],
-                    "precision_nonforest": report["Non-Forest"]["precision"],
-                    "recall_forest": report["Forest"]["recall"],
-                    "recall_nonforest": report["Non-Forest"]["recall"],
-                    "missing_pct": missing_px_pct,
-                }
-            )
-
-            y_true_all.extend(y_true)
-            y_pred_all.extend(y_pred_valid)
+            months_done.append(month)
+            done_idx.append(m_idx)
+            n_polygons.append(n_polys_this_month)
+            missing_pcts.append(missing_px_pct)
 
         # ------------------------------------------------------------------
-        # Overall metrics – across every month
+        # Per-month + overall metrics – derived from the confusion matrices
         # ------------------------------------------------------------------
-        if not y_true_all:
+        cms = cms[done_idx]
+        if cms.sum() == 0:
             raise RuntimeError("No predictions were generated across any month – nothing to benchmark.")
 
-        overall_acc = accuracy_score(y_true_all, y_pred_all)
-        overall_report = classification_report(
-            y_true_all,
-            y_pred_all,
-            labels=["Forest", "Non-Forest"],
-            output_dict=True,
-            zero_division=0,
-        )
-        metrics_rows.append(
+        # Overall row is simply the sum of the monthly matrices
+        all_cms = np.concatenate([cms, cms.sum(axis=0, keepdims=True)])
+        metrics = _confusion_metrics(all_cms)
+
+        metrics_df = pd.DataFrame(
             {
                 "run_id": self.run_id,
                 "collection": self.collection,
-                "month": "overall",
-                "n_polygons": total_polygons_considered,
-                "n_pixels": len(y_pred_all),
-                "accuracy": overall_acc,
-                "f1_forest": overall_report["Forest"]["f1-score"],
-                "f1_nonforest": overall_report["Non-Forest"]["f1-score"],
-                "precision_forest": overall_report["Forest"]["precision"],
-                "precision_nonforest": overall_report["Non-Forest"]["precision"],
-                "recall_forest": overall_report["Forest"]["recall"],
-                "recall_nonforest": overall_report["Non-Forest"]["recall"],
-                "missing_pct": missing_total / total_pixels_all if total_pixels_all else np.nan,
-            }
-        )
-
-        metrics_df = pd.DataFrame(metrics_rows)
+                "month": months_done + ["overall"],
+                "n_polygons": n_polygons + [total_polygons_considered],
+                "n_pixels": all_cms.sum(axis=(1, 2)),
+                **metrics,
+                "missing_pct": missing_pcts + [
+                    missing_total / total_pixels_all if total_pixels_all else np.nan
+                ],
+            },
+            columns=list(_METRIC_COLS),
+        ).astype(_METRIC_DTYPES, copy=False)
 
         # ------------------------------------------------------------------
         # Save + quick-look
@@ -2,15 +2,84 @@ import xarray as xr
 import rioxarray
 import numpy as np
 from pathlib import Path
-from osgeo import gdal, gdalconst
+from osgeo import gdal
 import rasterio
+from concurrent.futures import ThreadPoolExecutor
+from ml_pipeline.raster_utils import COG_READ_ENV, sieve_flag
 from ml_pipeline.stac_builder import STACManager, STACManagerConfig
-from ml_pipeline.s3_utils import upload_file, list_files, download_file
+from ml_pipeline.s3_utils import upload_file, list_files, download_file, LARGE_FILE_TRANSFER
 import tempfile
 import shutil
 import logging
 
+# ---------------------------------------------------------------------
+# Per-observation tally: prediction code ➜ (valid, forest, non-forest, water)
+# ---------------------------------------------------------------------
+# Cloud, shadow, haze, sensor error and no data are not clear observations
+_INVALID_CODES = (2, 3, 5, 6, 255)
+_TALLY_LUT = np.zeros((256, 4), dtype=np.uint8)
+_TALLY_LUT[:, 0] = 1
+_TALLY_LUT[list(_INVALID_CODES), 0] = 0
+_TALLY_LUT[0, 1] = _TALLY_LUT[1, 2] = _TALLY_LUT[4, 3] = 1
+_VALID_LUT = _TALLY_LUT[:, 0].astype(bool)
+# Latest clear observation ➜ forest flag: forest 1, non-forest / water 0
+_LATEST_FLAG_LUT = np.full(256, 255, dtype=np.uint8)
+_LATEST_FLAG_LUT[0] = 1
+_LATEST_FLAG_LUT[[1, 4]] = 0
+
+
+def _as_codes(arr: np.ndarray) -> np.ndarray:
+    """Prediction codes as uint8, with NaN (masked no data) mapped to 255."""
+    if arr.dtype == np.uint8:
+        return arr
+    return np.where(np.isnan(arr), 255, arr).astype(np.uint8)
+
+
+def _compact_valid(codes: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Shift every pixel's clear observations to the front of the time axis,
+    keeping their order – the array form of dropping the invalid months from
+    each pixel's series. Returns the compacted (time, ...) uint8 codes, padded
+    with 255 after the last clear observation, and the per-pixel count.
+    """
+    n_time = codes.shape[0]
+    flat = codes.reshape(n_time, -1)
+    ok = _VALID_LUT[flat]
+    compact = np.full(flat.shape, 255, dtype=np.uint8)
+    count = np.zeros(flat.shape[1], dtype=np.intp)
+    for t in range(n_time):
+        hit = np.flatnonzero(ok[t])
+        compact[count[hit], hit] = flat[t, hit]
+        count[hit] += 1
+    return compact.reshape(codes.shape), count.reshape(codes.shape[1:])
+
+
+def _first_match(hits: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Per pixel: whether any step along axis 0 matched, and the first one."""
+    return hits.any(axis=0), hits.argmax(axis=0)
+
+
+def _tally_observations(arr: np.ndarray) -> np.ndarray:
+    """
+    Walk a (time, y, x) prediction stack once and return an (y, x, 4) uint8
+    array of [valid, forest, non-forest, water] observation counts.
+
+    Every time slice is mapped through a one-hot lookup table and added to
+    the running tally, so the whole cube is read a single time and no
+    (time, y, x) boolean temporaries are created. NaN (masked no data)
+    counts as 255.
+    """
+    tally = np.zeros(arr.shape[1:] + (4,), dtype=np.uint8)
+    for layer in arr:
+        tally += _TALLY_LUT[_as_codes(layer)]
+    return tally
+
+
+
+
 class CompositeGenerator:
+    STRIP_ROWS = 512  # rows per forest-flag strip – matches the COG block size
+
     def __init__(self, run_id: str, year: str, root: str = None):
         self.run_id = run_id
         self.year = year
@@ -44,8 +113,19 @@ class CompositeGenerator:
         if self.temp_dir:
             shutil.rmtree(self.temp_dir)
         
-    def generate_composite(self, quad_name: str, min_pixels: int = 10, skip_s3_upload: bool = False, use_local_files: bool = False, algorithm: str = 'majority_vote'):
-        """Generate annual composite for a given quad."""
+    def generate_composite(self, quad_name: str, min_pixels: int = 10, skip_s3_upload: bool = False, use_local_files: bool = False, algorithm: str = 'majority_vote',
+                           cache_observations: bool = False):
+        """Generate annual composite for a given quad.
+
+        With *cache_observations* and the majority vote, the per-pixel
+        observation counts are kept in
+        ``<run>/cache/<quad>_<year>_observations.npz``. Re-running the
+        majority vote (e.g. with another *min_pixels*) then loads them
+        instead of reading and stacking the monthly COGs again. Local
+        predictions newer than the cache invalidate it; S3 predictions are
+        not checked. The other algorithms need the full series and ignore
+        the option.
+        """
         if not self.temp_dir:
             raise RuntimeError("CompositeGenerator must be used as a context manager")
             
@@ -84,38 +164,56 @@ class CompositeGenerator:
         print("Retrieving monthly COGs...")
         print(f"Retrieved {len(cogs)} COGs: {cogs}")
 
-        # Open and stack monthly data
-        print("Stacking monthly data...")
-        stacked = self._stack_monthly_data(cogs)
-        print("Stacked monthly data.")
-        
-        # Generate forest flag
-        print(f"Generating forest flag using {algorithm} algorithm...")
-        forest_flag = self._generate_forest_flag(stacked, algorithm)
-        print("Generated forest flag.")
+        cache_path = self.run_path / "cache" / f"{quad_name}_{self.year}_observations.npz"
+        use_cache = cache_observations and algorithm == 'majority_vote'
+        cached = None
+        if use_cache:
+            cached = self._load_observation_cache(cache_path, cogs if use_local_files else None)
+        
+        if cached is not None:
+            # The majority vote only needs the observation counts
+            print(f"Using cached observation counts: {cache_path}")
+            stacked = None
+            tally, valid = cached
+            print(f"Generating forest flag using {algorithm} algorithm...")
+            forest_flag = self._majority_vote_algorithm(None, valid, tally)
+            print("Generated forest flag.")
+        else:
+            # Open and stack monthly data
+            print("Stacking monthly data...")
+            stacked = self._stack_monthly_data(cogs)
+            print("Stacked monthly data.")
+            
+            # Generate forest flag
+            print(f"Generating forest flag using {algorithm} algorithm...")
+            if use_cache:
+                # Tally once – the same counts are cached and voted on
+                tally, valid = self._save_observation_cache(cache_path, stacked)
+                forest_flag = self._majority_vote_algorithm(None, valid, tally)
+            else:
+                forest_flag = self._generate_forest_flag(stacked, algorithm)
+            print("Generated forest flag.")
         
-        # Create output files in temp directory
+        # Create output files – straight into the persistent composites
+        # directory when keeping them for local merging, so they never have
+        # to be moved (a copy when the temp dir is on another filesystem)
         print("Creating output files...")
-        stacked_path, cover_path = self._create_output_files(quad_name, forest_flag, stacked, min_pixels)
+        if skip_s3_upload:
+            out_dir = self.run_path / "composites"
+            out_dir.mkdir(parents=True, exist_ok=True)
+        else:
+            out_dir = None
+        stacked_path, cover_path = self._create_output_files(quad_name, forest_flag, stacked, min_pixels, out_dir)
         print("Created output files.")
         
         try:
             if skip_s3_upload:
-                # Keep local file for later merging - move to persistent composites directory
+                # Keep local file for later merging - already written to the
+                # persistent composites directory
                 print("Skipping S3 upload, keeping file for local merging...")
-                
-                # Create composites directory in run path
-                composites_dir = self.run_path / "composites"
-                composites_dir.mkdir(exist_ok=True)
-                
-                # Move file from temp to persistent location
-                persistent_path = composites_dir / cover_path.name
-                import shutil
-                shutil.move(str(cover_path), str(persistent_path))
-                
-                self.local_composite_files.append(persistent_path)
-                print(f"Moved composite to persistent location: {persistent_path}")
-                return str(persistent_path)  # Return path for tracking
+                self.local_composite_files.append(cover_path)
+                print(f"Saved composite to persistent location: {cover_path}")
+                return str(cover_path)  # Return path for tracking
             else:
                 # Upload to S3
                 print("Uploading to S3...")
@@ -138,15 +236,117 @@ class CompositeGenerator:
             if not skip_s3_upload and cover_path.exists():
                 cover_path.unlink()
         
-    def _stack_monthly_data(self, cogs):
-        """Stack monthly data into a single xarray."""
-        def open_month(url):
-            da = rioxarray.open_rasterio(url, masked=True)
-            month = url.split('_')[-1].split('.')[0]
-            return da.expand_dims(time=[month])
-            
-        return xr.concat([open_month(u) for u in cogs], dim="time").load()
+    def _stack_monthly_data(self, cogs, max_workers: int = 12):
+        """Stack monthly data into a single xarray.
+
+        Months are read concurrently with plain rasterio straight into one
+        preallocated uint8 (time, band, y, x) cube – no float/NaN promotion
+        and no per-month DataArrays to concatenate. No data stays 255. Each
+        read is dominated by S3 round-trips, so the workers overlap almost
+        perfectly. Month order follows *cogs*.
+        """
+        with rasterio.Env(**COG_READ_ENV), rasterio.open(cogs[0]) as src:
+            height, width = src.height, src.width
+            crs, transform = src.crs, src.transform
+
+        shape = (len(cogs), 1, height, width)
+        if self.temp_dir:
+            # File-backed so parallel quad workers don't each pin the whole
+            # cube in RSS – the page cache evicts it under memory pressure.
+            # The file is unlinked on close; the mapping keeps it alive.
+            with tempfile.TemporaryFile(dir=self.temp_dir) as fh:
+                cube = np.memmap(fh, mode="w+", dtype=np.uint8, shape=shape)
+        else:
+            cube = np.empty(shape, dtype=np.uint8)
+
+        def read_month(i):
+            # rasterio.Env is thread-local – enter it inside the worker
+            with rasterio.Env(**COG_READ_ENV), rasterio.open(cogs[i]) as src:
+                if (src.height, src.width) != (height, width):
+                    raise ValueError(
+                        f"{cogs[i]} is {src.height}x{src.width}, expected {height}x{width}"
+                    )
+                src.read(1, out=cube[i, 0])
+                # 255 is the no-data sentinel downstream – normalise if needed
+                if src.nodata is not None and src.nodata != 255:
+                    cube[i, 0][cube[i, 0] == src.nodata] = 255
+            return bool(_VALID_LUT[cube[i, 0]].any())
+
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(cogs)))) as pool:
+            has_data = list(pool.map(read_month, range(len(cogs))))
+
+        months = [url.split('_')[-1].split('.')[0] for url in cogs]
+
+        # Months without a single clear observation add nothing to any
+        # algorithm – compact the others to the front of the cube (in place,
+        # so a memmap stays a memmap) and drop them
+        keep = [i for i, ok in enumerate(has_data) if ok]
+        if keep and len(keep) < len(cogs):
+            print(f"Skipping months without clear observations: "
+                  f"{[m for m, ok in zip(months, has_data) if not ok]}")
+            for j, i in enumerate(keep):
+                if i != j:
+                    cube[j] = cube[i]
+            cube = cube[:len(keep)]
+            months = [months[i] for i in keep]
+        # Pixel-centre coordinates, as rioxarray.open_rasterio would give them
+        xs = transform.c + (np.arange(width) + 0.5) * transform.a
+        ys = transform.f + (np.arange(height) + 0.5) * transform.e
+        stacked = xr.DataArray(
+            cube,
+            coords={"time": months, "band": [1], "y": ys, "x": xs},
+            dims=("time", "band", "y", "x"),
+        )
+        return stacked.rio.write_crs(crs).rio.write_transform(transform)
         
+    def _save_observation_cache(self, cache_path, stacked):
+        """Tally *stacked* and save the counts with their georeferencing.
+
+        The tally is what the majority vote reduces, see ``_tally_observations``.
+        Returns it in the form ``_load_observation_cache`` does: the (y, x, 4)
+        uint8 tally and the clear-observation count as a (y, x) DataArray.
+        """
+        data = stacked.sel(band=1)
+        tally = _tally_observations(data.values)
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        # Write under a temporary name so a reader never sees a partial file
+        tmp_path = cache_path.with_name(cache_path.stem + ".tmp.npz")
+        np.savez_compressed(
+            tmp_path,
+            tally=tally,
+            x=stacked.x.values,
+            y=stacked.y.values,
+            crs=stacked.rio.crs.to_wkt(),
+            transform=np.asarray(stacked.rio.transform())[:6],
+        )
+        tmp_path.replace(cache_path)
+        print(f"Cached observation counts: {cache_path}")
+        valid = xr.DataArray(tally[..., 0], coords=data.isel(time=0, drop=True).coords, dims=("y", "x"))
+        return tally, valid
+    
+    def _load_observation_cache(self, cache_path, local_cogs=None):
+        """Load cached observation counts, or None if missing or stale.
+
+        Returns the (y, x, 4) uint8 tally and the clear-observation count as a
+        georeferenced (y, x) DataArray.
+        """
+        if not cache_path.exists():
+            return None
+        if local_cogs and max(Path(c).stat().st_mtime for c in local_cogs) > cache_path.stat().st_mtime:
+            print(f"Observation cache is older than the predictions, ignoring: {cache_path}")
+            return None
+        
+        with np.load(cache_path) as cache:
+            tally = cache["tally"]
+            valid = xr.DataArray(
+                tally[..., 0],
+                coords={"y": cache["y"], "x": cache["x"]},
+                dims=("y", "x"),
+            )
+            crs = str(cache["crs"])
+            transform = rasterio.Affine(*cache["transform"])
+        return tally, valid.rio.write_crs(crs).rio.write_transform(transform)
+    
     def _generate_forest_flag(self, stacked, algorithm='majority_vote'):
         """Generate forest flag from stacked data.
         
@@ -154,359 +354,245 @@ class CompositeGenerator:
             stacked: xarray dataset with time series data
             algorithm: Algorithm to use ('majority_vote', 'temporal_trend', 'change_point', 'latest_valid', 'weighted_temporal')
         """
+        return self._generate_forest_flags(stacked, [algorithm])[algorithm]
+    
+    def _generate_forest_flags(self, stacked, algorithms):
+        """Generate the forest flag of several algorithms from the same stack.
+        
+        The masked, compacted series of each strip is built once and shared
+        by every requested algorithm, so comparing algorithms costs one pass
+        over the cube plus the reductions themselves.
+        
+        Args:
+            stacked: xarray dataset with time series data
+            algorithms: Algorithms to run, see ``_generate_forest_flag``
+        
+        Returns:
+            dict: algorithm ➜ forest flag DataArray
+        """
+        per_pixel_algorithms = {
+            'temporal_trend': self._temporal_trend_algorithm,
+            'change_point': self._change_point_algorithm,
+            'latest_valid': self._latest_valid_algorithm,
+            'weighted_temporal': self._weighted_temporal_algorithm,
+        }
+        for algorithm in algorithms:
+            if algorithm != 'majority_vote' and algorithm not in per_pixel_algorithms:
+                raise ValueError(f"Unknown algorithm: {algorithm}. Available: 'majority_vote', 'temporal_trend', 'change_point', 'latest_valid', 'weighted_temporal'")
+        
         data = stacked.sel(band=1)
+        coords = data.isel(time=0, drop=True).coords
+        results = {}
+        
+        if 'majority_vote' in algorithms:
+            # Count clear observations (one pass, shared with the majority vote)
+            tally = _tally_observations(data.values)
+            valid = xr.DataArray(tally[..., 0], coords=coords, dims=("y", "x"))
+            results['majority_vote'] = self._majority_vote_algorithm(data, valid, tally)
+        
+        per_pixel = {a: per_pixel_algorithms[a] for a in algorithms if a in per_pixel_algorithms}
+        if not per_pixel:
+            return results
+        
+        # The per-pixel algorithms build (time, y, x) temporaries – run them
+        # over block-aligned row strips so the working set stays at one strip
+        # of every month instead of the whole quad. Each strip is masked and
+        # compacted once here and handed to every algorithm, which only
+        # reduces over time
+        flags = {a: np.empty(data.shape[1:], dtype=np.uint8) for a in per_pixel}
+        for y0 in range(0, data.shape[1], self.STRIP_ROWS):
+            rows = slice(y0, y0 + self.STRIP_ROWS)
+            strip = data.isel(y=rows)
+            compact = _compact_valid(_as_codes(strip.values))
+            # The clear-observation count falls out of the same mask
+            valid = xr.DataArray(
+                compact[1], coords=strip.isel(time=0, drop=True).coords, dims=("y", "x")
+            )
+            for algorithm, run in per_pixel.items():
+                flags[algorithm][rows] = run(strip, valid, compact).values
         
-        # Count clear observations
-        valid = (~data.isin([2, 3, 5, 6, 255])).sum("time") # Don't count cloud, shadow, haze, sensor error, or no data
-        
-        if algorithm == 'majority_vote':
-            return self._majority_vote_algorithm(data, valid)
-        elif algorithm == 'temporal_trend':
-            return self._temporal_trend_algorithm(data, valid)
-        elif algorithm == 'change_point':
-            return self._change_point_algorithm(data, valid)
-        elif algorithm == 'latest_valid':
-            return self._latest_valid_algorithm(data, valid)
-        elif algorithm == 'weighted_temporal':
-            return self._weighted_temporal_algorithm(data, valid)
-        else:
-            raise ValueError(f"Unknown algorithm: {algorithm}. Available: 'majority_vote', 'temporal_trend', 'change_point', 'latest_valid', 'weighted_temporal'")
+        for algorithm, flag in flags.items():
+            results[algorithm] = xr.DataArray(flag, coords=coords, dims=("y", "x"))
+        return results
     
-    def _majority_vote_algorithm(self, data, valid):
+    def _majority_vote_algorithm(self, data, valid, tally=None):
         """Original majority vote algorithm."""
-        # Majority vote
-        masked = data.where(~data.isin([2, 3, 5, 6])) # Don't count cloud, shadow, haze, sensor error, or no data
-        class_counts = xr.concat(
-            [(masked == v).sum("time").assign_coords(class_val=v)
-             for v in [0, 1, 4]], # Count forest, non-forest, and water
-            dim="class_val"
-        )
+        # Majority vote over forest, non-forest and water
+        if tally is None:
+            tally = _tally_observations(data.values)
+        forest, nonforest, water = tally[..., 1], tally[..., 2], tally[..., 3]
         
-        majority = class_counts.argmax("class_val").astype(np.uint8) # Choose majority
+        # Forest wins ties, matching argmax over (forest, non-forest, water)
+        flag = ((forest >= nonforest) & (forest >= water)).astype(np.uint8)
+        flag[valid.values < 2] = 255
         
-        # Forest flag
-        forest_flag = majority.where(valid >= 2, 255)
-        forest_flag = (forest_flag == 0).astype(np.uint8)
-        forest_flag = forest_flag.where(valid >= 2, 255)
-        
-        return forest_flag
+        return xr.DataArray(flag, coords=valid.coords, dims=valid.dims)
     
-    def _temporal_trend_algorithm(self, data, valid):
-        """Temporal trend algorithm that considers time series patterns for deforestation detection."""
-        # Mask invalid observations
-        masked = data.where(~data.isin([2, 3, 5, 6])) # Don't count cloud, shadow, haze, sensor error, or no data
-        
-        # Apply the temporal trend logic pixel by pixel
-        def analyze_temporal_trend(pixel_series):
-            # Remove NaN values and get valid time series
-            if hasattr(pixel_series, 'dropna'):
-                valid_series = pixel_series.dropna('time')
-                values = valid_series.values
-            else:
-                # Handle numpy array case
-                values = pixel_series[~np.isnan(pixel_series)]
-            
-            if len(values) < 2:
-                return 255  # Not enough data
-            
-            # Helper function to get runs of consecutive values
-            def get_runs(arr):
-                if len(arr) == 0:
-                    return []
-                runs = []
-                current_val = arr[0]
-                current_count = 1
-                
-                for i in range(1, len(arr)):
-                    if arr[i] == current_val:
-                        current_count += 1
-                    else:
-                        runs.append((current_val, current_count))
-                        current_val = arr[i]
-                        current_count = 1
-                runs.append((current_val, current_count))
-                return runs
-            
-            # Get runs of consecutive values
-            runs = get_runs(values)
-            
-            # Recent consensus: if last 2-3 observations are consistent, use that
-            if len(values) >= 2:
-                recent_values = values[-2:]  # Last 2 values
-                if len(recent_values) >= 2 and np.all(recent_values == recent_values[0]):
-                    # Check if it's a valid class (forest=0, non-forest=1, water=4)
-                    if recent_values[0] in [0, 1, 4]:
-                        return 1 if recent_values[0] == 0 else 0  # Convert to forest flag
-                
-                # Check last 3 if available
-                if len(values) >= 3:
-                    recent_values = values[-3:]
-                    if len(recent_values) >= 3 and np.all(recent_values == recent_values[0]):
-                        if recent_values[0] in [0, 1, 4]:
-                            return 1 if recent_values[0] == 0 else 0
-            
-            # Change point detection: look for forest -> non-forest transitions
-            if len(runs) >= 2:
-                # Check if we have a clear transition from forest to non-forest
-                for i in range(len(runs) - 1):
-                    current_class, current_count = runs[i]
-                    next_class, next_count = runs[i + 1]
-                    
-                    # Forest to non-forest transition with sufficient evidence
-                    if (current_class == 0 and next_class == 1 and 
-                        current_count >= 2 and next_count >= 1):
-                        return 0  # Non-forest (deforestation detected)
-                    
-                    # Non-forest to forest transition (reforestation)
-                    if (current_class == 1 and next_class == 0 and 
-                        current_count >= 2 and next_count >= 2):
-                        return 1  # Forest (reforestation detected)
-            
-            # Run length analysis: filter out isolated classifications
-            if len(runs) >= 3:
-                # Look for pattern like [forest, isolated_non_forest, forest]
-                for i in range(1, len(runs) - 1):
-                    prev_class, prev_count = runs[i - 1]
-                    curr_class, curr_count = runs[i]
-                    next_class, next_count = runs[i + 1]
-                    
-                    # Isolated non-forest between forest observations (likely noise)
-                    if (prev_class == 0 and curr_class == 1 and next_class == 0 and
-                        curr_count == 1 and prev_count >= 1 and next_count >= 1):
-                        # Filter out the isolated observation and treat as forest
-                        return 1  # Forest
-                    
-                    # Isolated forest between non-forest observations (likely noise)
-                    if (prev_class == 1 and curr_class == 0 and next_class == 1 and
-                        curr_count == 1 and prev_count >= 1 and next_count >= 1):
-                        # Filter out the isolated observation and treat as non-forest
-                        return 0  # Non-forest
-            
-            # Fallback to majority vote if no clear temporal pattern
-            counts = {0: 0, 1: 0, 4: 0}  # forest, non-forest, water
-            for val in values:
-                if val in counts:
-                    counts[val] += 1
-            
-            # Find majority class
-            max_count = max(counts.values())
-            if max_count == 0:
-                return 255  # No valid data
-            
-            # Get the class with maximum count
-            majority_class = max(counts, key=counts.get)
-            
-            # Convert to forest flag (1=forest, 0=non-forest)
-            return 1 if majority_class == 0 else 0
-        
-        # Apply the analysis to each pixel
-        forest_flag = xr.apply_ufunc(
-            analyze_temporal_trend,
-            masked,
-            input_core_dims=[['time']],
-            output_core_dims=[[]],
-            vectorize=True,
-            dask='parallelized',
-            output_dtypes=[np.uint8]
-        )
+    def _temporal_trend_algorithm(self, data, valid, compact=None):
+        """Temporal trend algorithm that considers time series patterns for deforestation detection.
+
+        Whole-array form of the per-pixel rules, on each pixel's series of
+        clear observations (compacted to the front of the time axis), applied
+        from lowest to highest priority so the highest matching rule wins:
+
+        4. fallback – majority vote over forest / non-forest / water
+        3. isolated noise – a single non-forest between forest (or the
+           reverse) is treated as its surroundings; first occurrence wins
+        2. change point – forest run (≥2) ➜ non-forest, or non-forest run
+           (≥2) ➜ forest run (≥2); first transition wins
+        1. recent consensus – last two observations agree on a class
+        """
+        if compact is None:
+            compact = _compact_valid(_as_codes(data.values))
+        series, n = compact
+        n_time = series.shape[0]
+        
+        # 4. Fallback to majority vote (ties favour forest, then non-forest)
+        forest = np.count_nonzero(series == 0, axis=0)
+        nonforest = np.count_nonzero(series == 1, axis=0)
+        water = np.count_nonzero(series == 4, axis=0)
+        flag = ((forest >= nonforest) & (forest >= water)).astype(np.uint8)
+        flag[(forest == 0) & (nonforest == 0) & (water == 0)] = 255
+        
+        if n_time >= 3:
+            prev, curr, nxt = series[:-2], series[1:-1], series[2:]
+            
+            # 3. Run length analysis: filter out isolated classifications
+            noise_in_forest = (prev == 0) & (curr == 1) & (nxt == 0)
+            noise_in_nonforest = (prev == 1) & (curr == 0) & (nxt == 1)
+            hit, first = _first_match(noise_in_forest | noise_in_nonforest)
+            as_forest = np.take_along_axis(noise_in_forest, first[None], axis=0)[0]
+            flag = np.where(hit, as_forest, flag).astype(np.uint8)
+            
+            # 2. Change point detection: transition into `nxt` after a run of
+            #    ≥2 – deforestation needs ≥1 non-forest after it, reforestation
+            #    needs ≥2 forest after it
+            after = np.concatenate([series[3:], np.full((1,) + n.shape, 255, np.uint8)])
+            deforest = (prev == 0) & (curr == 0) & (nxt == 1)
+            reforest = (prev == 1) & (curr == 1) & (nxt == 0) & (after == 0)
+            hit, first = _first_match(deforest | reforest)
+            as_forest = np.take_along_axis(reforest, first[None], axis=0)[0]
+            flag = np.where(hit, as_forest, flag).astype(np.uint8)
+        
+        # 1. Recent consensus: last 2 observations agree on a valid class
+        last = np.take_along_axis(series, np.clip(n - 1, 0, None)[None], axis=0)[0]
+        before = np.take_along_axis(series, np.clip(n - 2, 0, None)[None], axis=0)[0]
+        consensus = (n >= 2) & (last == before) & ((last == 0) | (last == 1) | (last == 4))
+        flag = np.where(consensus, last == 0, flag).astype(np.uint8)
         
         # Apply minimum valid observations requirement (3 observations needed for pattern recognition)
-        forest_flag = forest_flag.where(valid >= 3, 255)
+        flag[valid.values < 3] = 255
         
-        return forest_flag
+        return xr.DataArray(flag, coords=valid.coords, dims=valid.dims)
     
-    def _change_point_algorithm(self, data, valid):
-        """Change point detection algorithm that identifies significant transitions in time series."""
-        # Mask invalid observations
-        masked = data.where(~data.isin([2, 3, 5, 6])) # Don't count cloud, shadow, haze, sensor error, or no data
-        
-        def detect_change_point(pixel_series):
-            # Remove NaN values and get valid time series
-            if hasattr(pixel_series, 'dropna'):
-                valid_series = pixel_series.dropna('time')
-                values = valid_series.values
-            else:
-                # Handle numpy array case
-                values = pixel_series[~np.isnan(pixel_series)]
-            
-            if len(values) < 3:
-                return 255  # Not enough data for change point detection
-            n = len(values)
-            
-            # Only consider forest (0) and non-forest (1) for change point detection
-            # Convert water (4) to non-forest (1) for simplicity
-            binary_values = np.where(values == 0, 0, 1)
-            
-            # Find the best change point by testing different split positions
-            best_score = -np.inf
-            best_changepoint = None
-            best_post_change_class = None
-            
-            # Test change points from position 1 to n-2 (need at least 1 observation on each side)
-            for cp in range(1, n - 1):
-                pre_segment = binary_values[:cp]
-                post_segment = binary_values[cp:]
-                
-                # Calculate dominant class in each segment
-                pre_forest_count = np.sum(pre_segment == 0)
-                pre_nonforest_count = np.sum(pre_segment == 1)
-                post_forest_count = np.sum(post_segment == 0)
-                post_nonforest_count = np.sum(post_segment == 1)
-                
-                # Determine dominant class in each segment
-                pre_dominant = 0 if pre_forest_count > pre_nonforest_count else 1
-                post_dominant = 0 if post_forest_count > post_nonforest_count else 1
-                
-                # Only consider this a valid change point if the dominant classes differ
-                if pre_dominant != post_dominant:
-                    # Calculate confidence scores based on segment homogeneity
-                    pre_confidence = max(pre_forest_count, pre_nonforest_count) / len(pre_segment)
-                    post_confidence = max(post_forest_count, post_nonforest_count) / len(post_segment)
-                    
-                    # Score is the product of confidences weighted by segment lengths
-                    score = (pre_confidence * len(pre_segment) + post_confidence * len(post_segment)) / n
-                    
-                    # Bonus for deforestation (forest -> non-forest) to prioritize these changes
-                    if pre_dominant == 0 and post_dominant == 1:
-                        score *= 1.2
-                    
-                    if score > best_score:
-                        best_score = score
-                        best_changepoint = cp
-                        best_post_change_class = post_dominant
-            
-            # If we found a significant change point, use post-change classification
-            if best_changepoint is not None and best_score > 0.6:  # Threshold for significance
-                return 1 if best_post_change_class == 0 else 0  # Convert to forest flag
-            
-            # Fallback to majority vote if no significant change point detected
-            forest_count = np.sum(binary_values == 0)
-            nonforest_count = np.sum(binary_values == 1)
-            
-            if forest_count > nonforest_count:
-                return 1  # Forest
-            elif nonforest_count > forest_count:
-                return 0  # Non-forest
-            else:
-                # Tie - use the last observation
-                return 1 if binary_values[-1] == 0 else 0
-        
-        # Apply the change point detection to each pixel
-        forest_flag = xr.apply_ufunc(
-            detect_change_point,
-            masked,
-            input_core_dims=[['time']],
-            output_core_dims=[[]],
-            vectorize=True,
-            dask='parallelized',
-            output_dtypes=[np.uint8]
-        )
+    def _change_point_algorithm(self, data, valid, compact=None):
+        """Change point detection algorithm that identifies significant transitions in time series.
+
+        Works on each pixel's series of clear observations (compacted to the
+        front of the time axis), reduced to forest (0) vs non-forest (1 –
+        water counts as non-forest). Every split point is scored for all
+        pixels at once from cumulative forest counts; the first best-scoring
+        split whose two sides have different dominant classes wins.
+        """
+        if compact is None:
+            compact = _compact_valid(_as_codes(data.values))
+        series, n = compact
+        n_time = series.shape[0]
+        forest_so_far = np.cumsum(series == 0, axis=0, dtype=np.int16)
+        total_forest = forest_so_far[-1]
+        
+        # Find the best change point by testing different split positions
+        # (need at least 1 observation before and 2 after each split)
+        best_score = np.full(n.shape, -np.inf)
+        best_post_change_class = np.zeros(n.shape, dtype=np.uint8)
+        for cp in range(1, n_time - 1):
+            pre_forest_count = forest_so_far[cp - 1]
+            pre_nonforest_count = cp - pre_forest_count
+            post_forest_count = total_forest - pre_forest_count
+            post_nonforest_count = (n - cp) - post_forest_count
+            
+            # Determine dominant class in each segment (ties ➜ non-forest)
+            pre_dominant = (pre_forest_count <= pre_nonforest_count).astype(np.uint8)
+            post_dominant = (post_forest_count <= post_nonforest_count).astype(np.uint8)
+            
+            # Calculate confidence scores based on segment homogeneity – same
+            # float expression as the scalar form, so ties break identically
+            with np.errstate(divide="ignore", invalid="ignore"):
+                pre_confidence = np.maximum(pre_forest_count, pre_nonforest_count) / cp
+                post_confidence = np.maximum(post_forest_count, post_nonforest_count) / (n - cp)
+                score = (pre_confidence * cp + post_confidence * (n - cp)) / n
+            
+            # Bonus for deforestation (forest -> non-forest) to prioritize these changes
+            score = np.where((pre_dominant == 0) & (post_dominant == 1), score * 1.2, score)
+            
+            better = (cp <= n - 2) & (pre_dominant != post_dominant) & (score > best_score)
+            best_score[better] = score[better]
+            best_post_change_class[better] = post_dominant[better]
+        
+        # Fallback to majority vote if no significant change point detected;
+        # a tie goes to the last observation
+        nonforest_count = n - total_forest
+        last = np.take_along_axis(series, np.clip(n - 1, 0, None)[None], axis=0)[0]
+        flag = np.where(total_forest == nonforest_count, last == 0, total_forest > nonforest_count)
+        
+        # If we found a significant change point, use post-change classification
+        flag = np.where(best_score > 0.6, best_post_change_class == 0, flag).astype(np.uint8)
         
         # Apply minimum valid observations requirement (4 observations needed for statistical significance)
-        forest_flag = forest_flag.where(valid >= 4, 255)
+        flag[valid.values < 4] = 255
         
-        return forest_flag
+        return xr.DataArray(flag, coords=valid.coords, dims=valid.dims)
     
-    def _latest_valid_algorithm(self, data, valid):
-        """Latest valid algorithm that uses the most recent valid observation."""
-        # Mask invalid observations
-        masked = data.where(~data.isin([2, 3, 5, 6])) # Don't count cloud, shadow, haze, sensor error, or no data
-        
-        def get_latest_valid(pixel_series):
-            # Remove NaN values and get valid time series
-            if hasattr(pixel_series, 'dropna'):
-                valid_series = pixel_series.dropna('time')
-                values = valid_series.values
-            else:
-                # Handle numpy array case
-                values = pixel_series[~np.isnan(pixel_series)]
-            
-            if len(values) < 1:
-                return 255  # No valid data
-            
-            # Get the last valid observation
-            latest_value = values[-1]
-            
-            # Convert to forest flag (1=forest, 0=non-forest)
-            if latest_value == 0:  # Forest
-                return 1
-            elif latest_value in [1, 4]:  # Non-forest or water
-                return 0
-            else:
-                return 255  # Invalid value
-        
-        # Apply the latest valid logic to each pixel
-        forest_flag = xr.apply_ufunc(
-            get_latest_valid,
-            masked,
-            input_core_dims=[['time']],
-            output_core_dims=[[]],
-            vectorize=True,
-            dask='parallelized',
-            output_dtypes=[np.uint8]
-        )
+    def _latest_valid_algorithm(self, data, valid, compact=None):
+        """Latest valid algorithm that uses the most recent valid observation.
+
+        The most recent clear observation is the last entry of each pixel's
+        compacted series (padding 255 where there is none).
+        """
+        if compact is None:
+            compact = _compact_valid(_as_codes(data.values))
+        series, n = compact
+        latest_value = np.take_along_axis(series, np.clip(n - 1, 0, None)[None], axis=0)[0]
+        
+        # Convert to forest flag (1=forest, 0=non-forest, 255=no valid data)
+        forest_flag = _LATEST_FLAG_LUT[latest_value]
         
         # Apply minimum valid observations requirement
-        forest_flag = forest_flag.where(valid >= 1, 255)  # Only need 1 valid observation
+        forest_flag[valid.values < 1] = 255  # Only need 1 valid observation
         
-        return forest_flag
+        return xr.DataArray(forest_flag, coords=valid.coords, dims=valid.dims)
     
-    def _weighted_temporal_algorithm(self, data, valid):
-        """Weighted temporal algorithm that weights recent observations higher."""
-        # Mask invalid observations
-        masked = data.where(~data.isin([2, 3, 5, 6])) # Don't count cloud, shadow, haze, sensor error, or no data
-        
-        def weighted_classification(pixel_series):
-            # Remove NaN values and get valid time series
-            if hasattr(pixel_series, 'dropna'):
-                valid_series = pixel_series.dropna('time')
-                values = valid_series.values
-            else:
-                # Handle numpy array case
-                values = pixel_series[~np.isnan(pixel_series)]
-            
-            if len(values) < 1:
-                return 255  # No valid data
-            n = len(values)
-            
-            # Create exponential decay weights (recent observations have higher weights)
+    def _weighted_temporal_algorithm(self, data, valid, compact=None):
+        """Weighted temporal algorithm that weights recent observations higher.
+
+        Each pixel's clear observations (compacted to the front of the time
+        axis) are weighted by exp(-0.3 * distance from its last clear
+        observation) and summed per class, accumulating in time order like
+        the scalar form so equal sums tie-break identically.
+        """
+        if compact is None:
+            compact = _compact_valid(_as_codes(data.values))
+        series, n = compact
+        
+        # Calculate weighted counts for each class: forest, non-forest, water
+        weighted = np.zeros((3,) + n.shape)
+        for i, obs in enumerate(series):
             # Weight = exp(-0.3 * distance_from_end)
-            weights = np.exp(-0.3 * np.arange(n-1, -1, -1))
-            
-            # Calculate weighted counts for each class
-            weighted_counts = {0: 0.0, 1: 0.0, 4: 0.0}  # forest, non-forest, water
-            
-            for i, val in enumerate(values):
-                if val in weighted_counts:
-                    weighted_counts[val] += weights[i]
-            
-            # Find the class with maximum weighted count
-            if sum(weighted_counts.values()) == 0:
-                return 255  # No valid data
-            
-            max_weighted_class = max(weighted_counts, key=weighted_counts.get)
-            
-            # Convert to forest flag (1=forest, 0=non-forest)
-            return 1 if max_weighted_class == 0 else 0
+            weight = np.exp(-0.3 * (n - 1 - i))
+            for k, value in enumerate((0, 1, 4)):
+                weighted[k] += np.where(obs == value, weight, 0.0)
         
-        # Apply the weighted temporal logic to each pixel
-        forest_flag = xr.apply_ufunc(
-            weighted_classification,
-            masked,
-            input_core_dims=[['time']],
-            output_core_dims=[[]],
-            vectorize=True,
-            dask='parallelized',
-            output_dtypes=[np.uint8]
-        )
+        # Forest wins ties (first maximum in forest, non-forest, water order)
+        flag = ((weighted[0] >= weighted[1]) & (weighted[0] >= weighted[2])).astype(np.uint8)
+        flag[weighted.sum(axis=0) == 0] = 255  # No valid data
         
         # Apply minimum valid observations requirement (2 observations adequate for exponential weighting)
-        forest_flag = forest_flag.where(valid >= 2, 255)
+        flag[valid.values < 2] = 255
         
-        return forest_flag
+        return xr.DataArray(flag, coords=valid.coords, dims=valid.dims)
         
-    def _create_output_files(self, quad_name, forest_flag, stacked, min_pixels):
-        """Create and save output files in temp directory."""
+    def _create_output_files(self, quad_name, forest_flag, stacked, min_pixels, out_dir=None):
+        """Create and save output files in *out_dir* (default: temp directory)."""
         # Create stacked file
         # stacked_stack = stacked.squeeze("band", drop=True)
         # stacked_stack = (
@@ -525,15 +611,22 @@ class CompositeGenerator:
         stacked_path = None
         
         # Save forest cover file
-        cover_path = Path(self.temp_dir) / f"{quad_name}_{self.year}_forest_cover.tif"
-        out = xr.concat([forest_flag], dim="band").transpose("band", "y", "x")
-        out.rio.to_raster(
-            cover_path,
-            dtype="uint8", tiled=True, compress="deflate"
+        cover_path = Path(out_dir or self.temp_dir) / f"{quad_name}_{self.year}_forest_cover.tif"
+        # Sieve in memory so the compressed output is encoded exactly once
+        flag = self._apply_sieve_filter(np.asarray(forest_flag.values, dtype=np.uint8), min_pixels)
+        profile = dict(
+            driver="GTiff", height=flag.shape[0], width=flag.shape[1], count=1,
+            dtype="uint8", crs=forest_flag.rio.crs, transform=forest_flag.rio.transform(),
+            nodata=255, tiled=True, blockxsize=512, blockysize=512,
+            compress="zstd", zstd_level=9, num_threads="ALL_CPUS",
         )
-        
-        # Apply sieve filter
-        self._apply_sieve_filter(cover_path, min_pixels)
+        try:
+            with rasterio.open(cover_path, "w", **profile) as dst:
+                dst.write(flag, 1)
+        except Exception:
+            # Never leave a partial composite behind for the merge to pick up
+            cover_path.unlink(missing_ok=True)
+            raise
         
         return stacked_path, cover_path
     
@@ -544,29 +637,14 @@ class CompositeGenerator:
                 Path(file_path).unlink()
         self.local_composite_files.clear()
         
-    def _apply_sieve_filter(self, tif_path, min_pixels):
-        """Apply sieve filter to remove small objects."""
-        gdal.UseExceptions()
-        ds = gdal.Open(str(tif_path), gdalconst.GA_Update)
-        if ds is None:
-            raise RuntimeError(f"GDAL failed to open {tif_path!s}")
-            
-        band = ds.GetRasterBand(1)
-        nodata = band.GetNoDataValue()
-        
-        gdal.SieveFilter(
-            srcBand=band,
-            maskBand=None,
-            dstBand=band,
-            threshold=min_pixels,
-            connectedness=8
-        )
-        
-        if nodata is not None:
-            band.SetNoDataValue(nodata)
-            
-        band.FlushCache()
-        ds = None
+    def _apply_sieve_filter(self, flag, min_pixels):
+        """Apply sieve filter to remove small objects.
+
+        Works on the in-memory uint8 flag (see ``raster_utils.sieve_flag``)
+        so the output GeoTIFF is written once, already sieved. Returns the
+        sieved array.
+        """
+        return sieve_flag(flag, min_pixels)
         
     def _upload_to_s3(self, quad_name, cover_path):
         """Upload to S3 and create STAC collection."""
@@ -624,14 +702,18 @@ class CompositeGenerator:
                 logger.info("ℹ️  Only one or no COG files found, skipping merge")
                 return None
                 
-            # Download all COGs to temp directory
+            # Download all COGs to temp directory – concurrently, since each
+            # download is latency-bound (s3_utils keeps one client per thread,
+            # so workers never share a connection pool)
             logger.info("⬇️  Downloading individual COGs...")
-            local_cog_paths = []
             
-            for i, cog_file in enumerate(cog_files):
+            def download_one(i):
                 local_path = Path(self.temp_dir) / f"composite_{i:04d}.tif"
-                download_file(cog_file['key'], local_path)
-                local_cog_paths.append(str(local_path))
+                download_file(cog_files[i]['key'], local_path)
+                return str(local_path)
+            
+            with ThreadPoolExecutor(max_workers=min(32, len(cog_files))) as pool:
+                local_cog_paths = list(pool.map(download_one, range(len(cog_files))))
                 
             logger.info(f"✅ Downloaded {len(local_cog_paths)} COG files")
         
@@ -647,63 +729,48 @@ class CompositeGenerator:
             
         logger.info(f"🔗 Merging COGs into: {merged_path.name}")
         
-        # Use GDAL BuildVRT and Translate for efficient merging
-        vrt_path = Path(self.temp_dir) / f"{self.run_id}_{self.year}_temp.vrt"
-        
-        # Initialize intermediate_path for finally block
-        intermediate_path = Path(self.temp_dir) / f"{self.run_id}_{self.year}_intermediate.tif"
+        # Use GDAL BuildVRT and Translate for efficient merging – the VRT is
+        # only XML, so keep it in GDAL's in-memory filesystem
+        vrt_path = f"/vsimem/{self.run_id}_{self.year}_temp.vrt"
         
         try:
-            # Build VRT first for efficient handling of overlapping regions
+            # Build VRT first for efficient handling of overlapping regions.
+            # 255 is declared as source nodata so empty quad edges neither
+            # overwrite neighbouring data nor get decoded as real pixels, and
+            # the mosaic itself carries nodata=255
             vrt_options = gdal.BuildVRTOptions(
                 resampleAlg='nearest',
+                resolution='highest',
                 addAlpha=False,
-                hideNodata=True
-            )
-            gdal.BuildVRT(str(vrt_path), local_cog_paths, options=vrt_options)
-            
-            # Translate VRT to intermediate GeoTIFF
-            translate_options = gdal.TranslateOptions(
-                format='GTiff',
-                creationOptions=[
-                    'TILED=YES',
-                    'COMPRESS=DEFLATE',
-                    'PREDICTOR=1',
-                    'BIGTIFF=IF_SAFER'
-                ]
+                srcNodata=255,
+                VRTNodata=255
             )
+            gdal.BuildVRT(vrt_path, local_cog_paths, options=vrt_options)
             
-            gdal.Translate(str(intermediate_path), str(vrt_path), options=translate_options)
-            
-            # Add overviews to intermediate file
-            logger.info("📈 Adding overviews to merged raster...")
-            ds = gdal.Open(str(intermediate_path), gdal.GA_Update)
-            if ds is None:
-                raise RuntimeError(f"Failed to open intermediate file: {intermediate_path}")
-            ds.BuildOverviews("NEAREST", [2, 4, 8, 16, 32])
-            ds = None
-            
-            # Convert to proper COG format
+            # Write the COG straight from the VRT – the COG driver tiles, builds
+            # the overviews and lays out the IFDs in one pass, so there is no
+            # intermediate GeoTIFF to write, update and copy again
             logger.info("🔄 Converting to Cloud Optimized GeoTIFF...")
             cog_options = gdal.TranslateOptions(
-                format='GTiff',
+                format='COG',
                 creationOptions=[
-                    'COPY_SRC_OVERVIEWS=YES',
-                    'TILED=YES',
-                    'COMPRESS=DEFLATE',
-                    'PREDICTOR=1',
+                    'COMPRESS=ZSTD',
+                    'LEVEL=9',
+                    'BLOCKSIZE=512',
+                    'OVERVIEW_RESAMPLING=NEAREST',
+                    'NUM_THREADS=ALL_CPUS',
                     'BIGTIFF=IF_SAFER'
                 ]
             )
             
-            gdal.Translate(str(merged_path), str(intermediate_path), options=cog_options)
+            gdal.Translate(str(merged_path), vrt_path, options=cog_options)
             
             logger.info(f"✅ Successfully merged {len(local_cog_paths)} COGs into single file")
             
             # Always upload merged COG to S3 for STAC collection creation
             merged_s3_key = f"datasets/cfw-{self.run_id}/{self.year}/{self.run_id}_{self.year}_merged_composite.tif"
             logger.info(f"⬆️  Uploading merged COG to S3: {merged_s3_key}")
-            upload_file(merged_path, merged_s3_key)
+            upload_file(merged_path, merged_s3_key, config=LARGE_FILE_TRANSFER)
             
             if use_local_files:
                 # For local workflow, keep local file and return local path
@@ -720,10 +787,8 @@ class CompositeGenerator:
             raise
         finally:
             # Clean up temp files
-            if vrt_path.exists():
-                vrt_path.unlink()
-            if intermediate_path.exists():
-                intermediate_path.unlink()
+            if gdal.VSIStatL(vrt_path) is not None:
+                gdal.Unlink(vrt_path)
             
             # Clean up downloaded files (but not local composite files if using local workflow)
             if not use_local_files:
@@ -805,50 +870,31 @@ class CompositeGenerator:
             logger.error("❌ No merged COG files found for STAC collection creation")
             return
             
-        # Process only the merged files manually
+        # Build the collection straight from the merged file(s) – no copy to a
+        # separate prefix just so the prefix listing would only find them
         collection_id = f"datasets-cfw-{self.run_id}-{self.year}"
         
-        # Use the existing process_year method but with a prefix that only matches merged files
-        # We'll temporarily copy the merged file to a separate location to isolate it
-        temp_prefix = f"datasets/cfw-{self.run_id}-merged/{self.year}/"
-        
-        # Copy merged file to temporary location for STAC processing
-        from ml_pipeline.s3_utils import copy_s3_object
-        
-        for merged_file in merged_files:
-            source_key = merged_file['key']
-            filename = source_key.split('/')[-1]
-            dest_key = f"{temp_prefix}{filename}"
+        try:
+            builder.process_year(
+                year=self.year,
+                prefix_on_s3=f"datasets/cfw-{self.run_id}",
+                collection_id=collection_id,
+                asset_key="data",
+                asset_roles=["classification"],
+                asset_title=f"ChocoForestWatch Annual Forest Cover - {self.run_id} (Merged)",
+                extra_asset_fields={
+                    "raster:bands": [
+                        {
+                            "name": "forest_flag",
+                            "nodata": 255,
+                            "data_type": "uint8",
+                            "description": "Forest flag (1=Forest, 0=Non-Forest, 255=No Data)"
+                        }
+                    ]
+                },
+                cogs=merged_files,
+            )
             
-            try:
-                copy_s3_object(source_key, dest_key)
-                logger.info(f"📁 Copied merged file for STAC: {dest_key}")
-                
-                # Now process with the isolated prefix
-                builder.process_year(
-                    year=self.year,
-                    prefix_on_s3=f"datasets/cfw-{self.run_id}-merged",
-                    collection_id=collection_id,
-                    asset_key="data",
-                    asset_roles=["classification"],
-                    asset_title=f"ChocoForestWatch Annual Forest Cover - {self.run_id} (Merged)",
-                    extra_asset_fields={
-                        "raster:bands": [
-                            {
-                                "name": "forest_flag",
-                                "nodata": 255,
-                                "data_type": "uint8",
-                                "description": "Forest flag (1=Forest, 0=Non-Forest, 255=No Data)"
-                            }
-                        ]
-                    }
-                )
-                
-                # Clean up temporary copy
-                from ml_pipeline.s3_utils import delete_s3_object
-                delete_s3_object(dest_key)
-                logger.info(f"🗑️  Cleaned up temporary file: {dest_key}")
-                
-            except Exception as e:
-                logger.error(f"❌ Error processing merged COG for STAC: {str(e)}")
-                raise 
\ No newline at end of file
+        except Exception as e:
+            logger.error(f"❌ Error processing merged COG for STAC: {str(e)}")
+            raise
@@ -10,11 +10,18 @@ pip install sqlalchemy python-dotenv psycopg2-binary
 
 from __future__ import annotations
 import os
+import threading
 from typing import Optional
 from sqlalchemy import create_engine
 from sqlalchemy.engine import Engine
 from dotenv import load_dotenv
 
+# Engines are cached per process and connection URL – each one owns a
+# connection pool, and a forked worker must never reuse its parent's
+_engines: dict[tuple[int, str], Engine] = {}
+_engines_lock = threading.Lock()
+_dotenv_loaded = False
+
 def get_db_connection(
     host: str = "localhost",
     port: Optional[str] = None,
@@ -25,6 +32,10 @@ def get_db_connection(
     """
     Get a SQLAlchemy engine configured for PostgreSQL database.
     
+    The engine is created once per process and connection settings and then
+    reused, so repeated calls share one connection pool instead of opening
+    a new pool each time. ``.env`` is loaded on the first call only.
+    
     Parameters
     ----------
     host : str, optional
@@ -43,9 +54,11 @@ def get_db_connection(
     Engine
         SQLAlchemy engine instance
     """
-    print("Getting DB connection...")
-    print("Loading environment variables...")
-    load_dotenv()
+    global _dotenv_loaded
+    if not _dotenv_loaded:
+        print("Loading environment variables...")
+        load_dotenv()
+        _dotenv_loaded = True
     
     # Use provided values or fall back to environment variables
     if(host == "remote"):
@@ -61,9 +74,13 @@ def get_db_connection(
     password = password or os.getenv('POSTGRES_PASSWORD')
     
     # Create database connection URL
-    print("Creating database connection URL...")
     db_url = f"postgresql://{user}:{password}@{host_ip}:{port}/{db_name}"
     
-    # Create and return engine
-    print("Creating engine...")
-    return create_engine(db_url)
+    # Create (once) and return engine
+    key = (os.getpid(), db_url)
+    with _engines_lock:
+        engine = _engines.get(key)
+        if engine is None:
+            print("Creating engine...")
+            engine = _engines[key] = create_engine(db_url)
+    return engine
@@ -6,21 +6,49 @@ using PostgreSQL/PostGIS database queries.
 from __future__ import annotations
 
 import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Iterator, Optional, List, Dict, Any
 
 import numpy as np
 import rasterio
-from rasterio.mask import mask
-from shapely.geometry import Point, mapping
+from rasterio.features import geometry_mask, geometry_window
+import shapely
+from shapely.geometry import mapping
+from shapely.strtree import STRtree
 from sqlalchemy import text
 import pandas as pd
 from ml_pipeline.db_utils import get_db_connection
+from ml_pipeline.raster_utils import COG_READ_ENV
+
+# GDAL environment of each extract_pixels worker thread
+_thread_env = threading.local()
+
+
+def _enter_read_env() -> None:
+    """Thread-pool initializer: enter COG_READ_ENV for the worker's lifetime.
+
+    rasterio.Env is thread-local, so each worker sets the GDAL config up
+    once instead of once per COG it opens. The env is deliberately never
+    exited: in a worker (non-main) thread rasterio keeps it in its
+    thread-local state and sets the options with
+    ``CPLSetThreadLocalConfigOption``, and no credentials are involved, so
+    nothing outlives the thread. extract_pixels joins its pool before
+    returning, so the env ends with the call and the caller's own GDAL
+    config is never touched.
+    """
+    _thread_env.env = rasterio.Env(**COG_READ_ENV)
+    _thread_env.env.__enter__()
 
 
 class TitilerExtractor:
     """High-level helper for listing COGs from database, extracting pixels, and sampling."""
 
+    # COG href ➜ native-CRS bounds, shared by all instances of the process.
+    # Quads are immutable, and the backend builds a new extractor per request.
+    _quad_bounds: Dict[str, rasterio.coords.BoundingBox] = {}
+
     def __init__(self, collection: str, band_indexes: list[int], db_host: str = "local"):
         """
         Parameters
@@ -36,6 +64,9 @@ class TitilerExtractor:
         self.band_indexes = band_indexes
         self.db_host = db_host
         self._db_engine = None
+        # collection ➜ (hrefs, STRtree of quad footprints), see _quad_footprints
+        self._footprints: Dict[str, tuple[list[str], STRtree]] = {}
+        self._footprints_lock = threading.Lock()
 
     # ------------------------------------------------------------------ #
     #  Metadata helpers
@@ -69,6 +100,43 @@ class TitilerExtractor:
 
 
 
+    def get_cog_urls_bulk(self, polygons_wgs84, collection: Optional[str] = None) -> dict[int, list[str]]:
+        """
+        Return the COG URLs intersecting each of several polygons at once.
+
+        All polygons are matched against the collection's quad footprints in
+        one vectorised STRtree query, instead of one lookup per polygon.
+
+        Parameters
+        ----------
+        polygons_wgs84 : sequence of shapely.geometry
+            Polygons in EPSG:4326.
+        collection : str, optional
+            Collection to query. If None, uses self.collection.
+
+        Returns
+        -------
+        dict[int, list[str]]
+            ``{polygon index: [COG URL, ...]}`` for every input polygon, with
+            URLs in the same order as :meth:`get_cog_urls`.
+        """
+        collection = collection or self.collection
+        urls: dict[int, list[str]] = {i: [] for i in range(len(polygons_wgs84))}
+        try:
+            hrefs, tree = self._quad_footprints(collection)
+        except Exception as e:
+            print(f"❌ Database query failed: {e}")
+            print("❌ No fallback available - database connection required")
+            return urls
+
+        geoms = np.empty(len(polygons_wgs84), dtype=object)
+        geoms[:] = list(polygons_wgs84)
+        poly_idx, quad_idx = tree.query(geoms, predicate="intersects")
+        order = np.lexsort((quad_idx, poly_idx))
+        for i, q in zip(poly_idx[order], quad_idx[order]):
+            urls[int(i)].append(hrefs[q])
+        return urls
+
     def get_all_cog_urls(self, collection: Optional[str] = None) -> list[str]:
         """Return every COG URL in *collection* (defaults to ``self.collection``).
         
@@ -123,24 +191,10 @@ class TitilerExtractor:
                 print(f"Retrieved {len(urls)} COGs from database")
                 
             else:
-                # Spatial intersection query
-                ecuador_wkt = polygon_wgs84.wkt
-                
-                query = text("""
-                    SELECT content->'assets'->'data'->>'href' as href,
-                           content->'id' as item_id
-                    FROM items 
-                    WHERE collection = :collection
-                    AND content->'assets'->'data' IS NOT NULL
-                    AND ST_Intersects(geometry, ST_GeomFromText(:ecuador_wkt, 4326))
-                """)
-                
-                df = pd.read_sql(query, self.db_engine, params={
-                    "collection": collection,
-                    "ecuador_wkt": ecuador_wkt
-                })
-                
-                urls = df['href'].tolist()
+                # Spatial intersection against the cached quad footprints
+                hrefs, tree = self._quad_footprints(collection)
+                hits = np.sort(tree.query(polygon_wgs84, predicate="intersects"))
+                urls = [hrefs[i] for i in hits]
                 if len(urls) == 0:
                     print(f"⚠️  Warning: Retrieved {len(urls)} COGs intersecting polygon from database")
                 # Only print success message for debugging if needed
@@ -152,6 +206,34 @@ class TitilerExtractor:
             print(f"❌ Database query failed: {e}")
             print("❌ No fallback available - database connection required")
             return []
+
+    def _quad_footprints(self, collection: str) -> tuple[list[str], STRtree]:
+        """
+        COG URLs and an STRtree of their footprints (EPSG:4326) for *collection*.
+
+        Loaded with one query the first time a collection is searched and kept
+        for the life of the extractor, so every later lookup is an in-process
+        tree query instead of a database round-trip. Batch callers (pixel
+        extraction, the benchmark's COG grouping) query all their polygons at
+        once through :meth:`get_cog_urls_bulk`; :meth:`get_cog_urls` serves
+        single-polygon lookups from the same tree.
+        """
+        footprints = self._footprints.get(collection)
+        if footprints is not None:
+            return footprints
+        with self._footprints_lock:
+            if collection not in self._footprints:
+                query = text("""
+                    SELECT content->'assets'->'data'->>'href' as href,
+                           ST_AsBinary(geometry) as footprint
+                    FROM items 
+                    WHERE collection = :collection
+                    AND content->'assets'->'data' IS NOT NULL
+                """)
+                df = pd.read_sql(query, self.db_engine, params={"collection": collection})
+                geoms = shapely.from_wkb([bytes(wkb) for wkb in df['footprint']])
+                self._footprints[collection] = (df['href'].tolist(), STRtree(geoms))
+            return self._footprints[collection]
     
 
     # ------------------------------------------------------------------ #
@@ -162,7 +244,7 @@ class TitilerExtractor:
         self,
         cog_url: str,
         count: int,
-        rng: Optional[random.Random] = None,
+        rng: Optional[random.Random | np.random.Generator] = None,
     ) -> List[Dict[str, Any]]:
         """
         Draw multiple random geographic points inside the bounding box of one quad / COG.
@@ -173,8 +255,9 @@ class TitilerExtractor:
             HREF to a Cloud-Optimised GeoTIFF (one NICFI quad).
         count : int
             Number of points to generate for this quad.
-        rng : random.Random, optional
+        rng : random.Random or numpy.random.Generator, optional
             Supply your own RNG (e.g. ``random.Random(seed)``) for repeatability.
+            A NumPy generator draws all coordinates in one vectorised call.
 
         Returns
         -------
@@ -184,37 +267,52 @@ class TitilerExtractor:
             "point": shapely.geometry.Point}
         """
         rng = rng or random
-        points = []
         
-        with rasterio.open(cog_url) as src:
-            # Uses metadata only – no raster blocks read.
-            bounds = src.bounds
-            # Draw uniform random lon/lat within bounding box
-            for _ in range(count):
-                x = rng.uniform(bounds.left, bounds.right)
-                y = rng.uniform(bounds.bottom, bounds.top)
-                points.append({
-                    "quad_id": Path(cog_url).stem,
-                    "cog_url": cog_url,
-                    "x": x,
-                    "y": y,
-                    "point": Point(x, y),
-                })
+        # STAC items only carry WGS84 bounds, and points are drawn in the
+        # COG's own CRS – so the header is read once per quad and cached
+        bounds = self._quad_bounds.get(cog_url)
+        if bounds is None:
+            with rasterio.Env(**COG_READ_ENV), rasterio.open(cog_url) as src:
+                # Uses metadata only – no raster blocks read.
+                bounds = self._quad_bounds[cog_url] = src.bounds
+        
+        # Draw uniform random lon/lat within bounding box
+        if isinstance(rng, np.random.Generator):
+            xs = rng.uniform(bounds.left, bounds.right, count)
+            ys = rng.uniform(bounds.bottom, bounds.top, count)
+        else:
+            # x then y per point, as always, so seeded runs repeat exactly
+            xy = np.array([
+                (rng.uniform(bounds.left, bounds.right), rng.uniform(bounds.bottom, bounds.top))
+                for _ in range(count)
+            ]).reshape(-1, 2)
+            xs, ys = xy[:, 0], xy[:, 1]
         
-        return points
+        quad_id = Path(cog_url).stem
+        return [
+            {"quad_id": quad_id, "cog_url": cog_url, "x": float(x), "y": float(y), "point": point}
+            for x, y, point in zip(xs, ys, shapely.points(xs, ys))
+        ]
 
     # ------------------------------------------------------------------ #
     #  Pixel extraction
     # ------------------------------------------------------------------ #
 
-    def extract_pixels(self, gdf) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    def extract_pixels(self, gdf, max_workers: int = 16) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
         """
         Extract pixels for each labelled polygon in *gdf*.
 
+        The COGs of all polygons are looked up in one bulk query, and the
+        (polygon, COG) reads – independent and latency-bound – run on a
+        thread pool of *max_workers*. Results keep the polygon / COG order of
+        the serial loop.
+
         Parameters
         ----------
         gdf : geopandas.GeoDataFrame
             Must contain geometry column and fields ``id`` and ``classLabel``.
+        max_workers : int, optional
+            Concurrent COG reads, by default 16.
 
         Returns
         -------
@@ -225,58 +323,92 @@ class TitilerExtractor:
         fid : np.ndarray
             1-D array of polygon IDs corresponding to each sample.
         """
-        gdf_wgs84 = gdf.to_crs("EPSG:4326")
-        gdf_3857 = gdf.to_crs("EPSG:3857")
+        # Reproject the geometry column only, and skip CRSs it is already in
+        # (training polygons are loaded in EPSG:4326)
+        geoms = gdf.geometry
+        epsg = geoms.crs.to_epsg() if geoms.crs is not None else None
+        geoms_wgs84 = geoms if epsg == 4326 else geoms.to_crs("EPSG:4326")
+        geoms_3857 = geoms if epsg == 3857 else geoms.to_crs("EPSG:3857")
 
+        # One entry per (polygon, COG) chunk – labels and ids are expanded to
+        # per-pixel arrays once at the end, not as Python lists per pixel
         pixels, labels, fids = [], [], []
-        total_polygons = len(gdf_wgs84)
+        total_polygons = len(geoms)
         
         print(f"🔍 Extracting pixels from {total_polygons} training polygons...")
 
-        for i, (wgs84_geom, webm_geom, fid, label) in enumerate(zip(
-            gdf_wgs84.geometry,
-            gdf_3857.geometry,
+        polygons = list(zip(
+            geoms_wgs84,
+            geoms_3857,
             gdf["id"],
             gdf["classLabel"],
-        ), 1):
+        ))
+        cog_lists = self.get_cog_urls_bulk([p[0] for p in polygons])
+
+        # One task per (polygon, COG) pair
+        tasks = []
+        for i, (wgs84_geom, webm_geom, fid, label) in enumerate(polygons, 1):
+            cog_urls = cog_lists[i - 1]
             print(f"   Processing polygon {i}/{total_polygons} (ID: {fid}, Class: {label})")
             
-            cog_urls = self.get_cog_urls(wgs84_geom)
             if len(cog_urls) == 0:
                 print(f"      ⚠️  No COGs found for polygon {fid}")
                 continue
-                
-            for cog in cog_urls:
-               # print("Extracting pixels from COG:", cog, "for polygon:", fid)
-                try:
-                    with rasterio.open(cog) as src:
-                        mask_geom = wgs84_geom if src.crs.to_epsg() == 4326 else webm_geom
-                        out, _ = mask(
-                            src,
-                            [mapping(mask_geom)],
-                            crop=True,
-                            indexes=self.band_indexes,
-                            all_touched=True,
-                        )
-                        arr = np.moveaxis(out, 0, -1).reshape(-1, len(self.band_indexes))
-                        nodata = src.nodata
-                        if nodata is not None:
-                            arr = arr[~np.all(arr == nodata, axis=1)]
-
-                    pixels.append(arr)
-                    labels.extend([label] * len(arr))
-                    fids.extend([fid] * len(arr))
-                except Exception as e:
-                    print(f"⚠️  Skipping Extracting pixels from this COG due to error: {cog} — {str(e)}")
+            tasks.extend((wgs84_geom, webm_geom, fid, label, cog) for cog in cog_urls)
+
+        with ThreadPoolExecutor(max_workers=max_workers, initializer=_enter_read_env) as pool:
+            for arr, label, fid in pool.map(self._extract_one, tasks):
+                if arr is None:
                     continue
+                pixels.append(arr)
+                labels.append(label)
+                fids.append(fid)
 
         if not pixels:
             raise RuntimeError("No valid pixels were extracted from any COGs.")
 
-        print("Pixels :", sum(len(p) for p in pixels))
-        print("Labels :", len(labels))
-        print("Fids   :", len(fids))
-        return np.vstack(pixels), np.array(labels), np.array(fids)
+        counts = [len(p) for p in pixels]
+        X = np.concatenate(pixels)
+        y = np.repeat(np.array(labels), counts)
+        fid = np.repeat(np.array(fids), counts)
+        print("Pixels :", len(X))
+        print("Labels :", len(y))
+        print("Fids   :", len(fid))
+        return X, y, fid
+
+    def _extract_one(self, task) -> tuple[Optional[np.ndarray], Any, Any]:
+        """
+        Read the pixels of one polygon from one COG.
+
+        *task* is ``(wgs84_geom, webm_geom, fid, label, cog)``. Returns
+        ``(pixels, label, fid)``; *pixels* is None when the COG could not be
+        read (the error is reported and the pair skipped). Runs on an
+        extract_pixels worker, which already has COG_READ_ENV entered.
+        """
+        wgs84_geom, webm_geom, fid, label, cog = task
+        try:
+            with rasterio.open(cog) as src:
+                mask_geom = [mapping(wgs84_geom if src.crs.to_epsg() == 4326 else webm_geom)]
+                # Read only the polygon's window and keep the pixels it touches
+                window = geometry_window(src, mask_geom)
+                data = src.read(self.band_indexes, window=window)
+                inside = geometry_mask(
+                    mask_geom,
+                    out_shape=data.shape[-2:],
+                    transform=src.window_transform(window),
+                    all_touched=True,
+                    invert=True,
+                )
+                px = data[:, inside]                            # (bands, n_px)
+                nodata = src.nodata
+                if nodata is not None:
+                    # Drop all-nodata pixels; reduce over bands on the
+                    # contiguous (bands, n_px) layout, before transposing
+                    px = px[:, (px != nodata).any(axis=0)]
+            return px.T, label, fid
+        except Exception as e:
+            print(f"⚠️  Skipping Extracting pixels from this COG due to error: {cog} — {str(e)}")
+            return None, label, fid
     
 # Get one random sample point per quad (deterministic with a seed)
 # for sample in ext.iter_one_random_point_per_quad(seed=42):
@@ -5,9 +5,11 @@ import pandas as pd
 
 def load_training_polygons(engine,
                            project_id: int,
-                           basemap_date: str,
+                           basemap_date: str | None = None,
                            table: str = "core_trainingpolygonset",
-                           geom_col: str = "polygons") -> gpd.GeoDataFrame:
+                           geom_col: str = "polygons",
+                           basemap_dates: list[str] | None = None,
+                           feature_ids: list[str] | None = None) -> gpd.GeoDataFrame:
     """Load training polygons from the database and convert them to a GeoDataFrame.
 
     This function retrieves training polygons from the specified database table,
@@ -17,11 +19,17 @@ def load_training_polygons(engine,
     Args:
         engine: SQLAlchemy database engine instance
         project_id (int): ID of the project to load polygons for
-        basemap_date (str): Date of the basemap in format 'YYYY-MM'
+        basemap_date (str, optional): Date of the basemap in format 'YYYY-MM'
         table (str, optional): Name of the database table containing polygons. 
             Defaults to "core_trainingpolygonset".
         geom_col (str, optional): Name of the geometry column in the table. 
             Defaults to "polygons".
+        basemap_dates (list[str], optional): Load several basemap dates in one
+            query instead of *basemap_date*; split the result on the
+            ``basemap_date`` column.
+        feature_ids (list[str], optional): Only return features with these ids.
+            Sets without any matching feature are filtered out in SQL and
+            non-matching features are skipped before their geometry is parsed.
 
     Returns:
         gpd.GeoDataFrame: A GeoDataFrame containing the training polygons with the following columns:
@@ -37,34 +45,66 @@ def load_training_polygons(engine,
         properties containing at least a 'classLabel'.
     """
     
+    if basemap_dates is None:
+        if basemap_date is None:
+            raise ValueError("Either basemap_date or basemap_dates must be given")
+        date_clause, date_param = "basemap_date = %s", basemap_date
+    else:
+        date_clause, date_param = "basemap_date = ANY(%s)", list(basemap_dates)
+
+    feature_clause, feature_params = "", ()
+    if feature_ids is not None:
+        feature_ids = [str(fid) for fid in feature_ids]
+        feature_clause = f"""
+        AND (
+          id::text = ANY(%s)
+          OR EXISTS (
+            SELECT 1 FROM jsonb_array_elements({geom_col} -> 'features') AS f
+            WHERE f ->> 'id' = ANY(%s)
+          )
+        )"""
+        feature_params = (feature_ids, feature_ids)
+
     q = f"""
       SELECT id, project_id, basemap_date, feature_count, {geom_col}
       FROM {table}
       WHERE excluded = false
-        AND basemap_date = %s
-        AND project_id = %s
+        AND {date_clause}
+        AND project_id = %s{feature_clause}
     """
-    raw = pd.read_sql(q, engine, params=(basemap_date, project_id))
+    raw = pd.read_sql(q, engine, params=(date_param, project_id, *feature_params))
 
     # If no data, return empty GeoDataFrame
     if raw.empty:
         return gpd.GeoDataFrame()
 
+    wanted = set(feature_ids) if feature_ids is not None else None
     rows = []
-    for _, row in raw.iterrows():
-        fc = row[geom_col]
+    # Plain column arrays – avoids building a pandas Series per set
+    for set_id, proj_id, bm_date, fc in zip(
+        raw["id"].to_numpy(),
+        raw["project_id"].to_numpy(),
+        raw["basemap_date"].to_numpy(),
+        raw[geom_col].to_numpy(),
+    ):
         if isinstance(fc, dict) and fc.get("type") == "FeatureCollection":
             for feat in fc["features"]:
+                fid = feat.get("id", set_id)
+                if wanted is not None and str(fid) not in wanted:
+                    continue
                 geom = shape(feat["geometry"])
                 rows.append(
                     {
-                        "id": feat.get("id", row["id"]),
-                        "project_id": row["project_id"],
-                        "basemap_date": row["basemap_date"],
+                        "id": fid,
+                        "project_id": proj_id,
+                        "basemap_date": bm_date,
                         "classLabel": feat["properties"].get("classLabel", ""),
                         "geometry": geom,
                     }
                 )
+    if not rows:
+        return gpd.GeoDataFrame()
+
     # Converts from EPSG:3857 to EPSG:4326 (lat/lon)
     gdf = gpd.GeoDataFrame(rows, crs="EPSG:3857").to_crs("EPSG:4326")
     return gdf
\ No newline at end of file
@@ -11,14 +11,33 @@ pip install boto3 python-dotenv
 from __future__ import annotations
 from pathlib import Path
 import os
+import threading
 import boto3
+from boto3.s3.transfer import TransferConfig
 from dotenv import load_dotenv
 from typing import Optional, Union
 
+# Clients are cached per thread (each keeps its own connection pool, so
+# concurrent transfers never queue on one pool) and per process/credentials
+_clients = threading.local()
+
+# Transfer settings for multi-GB objects (the merged yearly mosaic): larger
+# parts and more of them in flight than boto3's 8 MB x 10 default
+LARGE_FILE_TRANSFER = TransferConfig(
+    multipart_threshold=64 * 1024 * 1024,
+    multipart_chunksize=32 * 1024 * 1024,
+    max_concurrency=16,
+    use_threads=True,
+)
+
 def get_s3_client(bucket: str = "choco-forest-watch") -> tuple[boto3.client, str]:
     """
     Get an S3 client configured for DigitalOcean Spaces.
     
+    The client is built once per thread, process and credential set and then
+    reused, so repeated uploads/downloads skip the client setup and TLS
+    handshake. A forked worker never reuses its parent's client.
+    
     Parameters
     ----------
     bucket : str, optional
@@ -30,20 +49,35 @@ def get_s3_client(bucket: str = "choco-forest-watch") -> tuple[boto3.client, str
         A tuple containing the S3 client and bucket name
     """
     load_dotenv()
-    s3 = boto3.session.Session().client(
-        "s3",
-        region_name=os.getenv("AWS_REGION"),
-        endpoint_url="https://" + os.getenv("AWS_S3_ENDPOINT"),
-        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+    settings = (
+        os.getpid(),
+        os.getenv("AWS_REGION"),
+        os.getenv("AWS_S3_ENDPOINT"),
+        os.getenv("AWS_ACCESS_KEY_ID"),
+        os.getenv("AWS_SECRET_ACCESS_KEY"),
     )
+    cache = getattr(_clients, "by_settings", None)
+    if cache is None:
+        cache = _clients.by_settings = {}
+    
+    s3 = cache.get(settings)
+    if s3 is None:
+        _, region, endpoint, access_key, secret_key = settings
+        s3 = cache[settings] = boto3.session.Session().client(
+            "s3",
+            region_name=region,
+            endpoint_url="https://" + endpoint,
+            aws_access_key_id=access_key,
+            aws_secret_access_key=secret_key,
+        )
     return s3, bucket
 
 def upload_file(
     local_path: Union[Path, str],
     remote_key: str,
     content_type: str = "image/tiff",
-    bucket: Optional[str] = None
+    bucket: Optional[str] = None,
+    config: Optional[TransferConfig] = None,
 ) -> None:
     """
     Upload a file to DigitalOcean Spaces.
@@ -58,6 +92,9 @@ def upload_file(
         The content type of the file, by default "image/tiff"
     bucket : str, optional
         The bucket to upload to. If None, uses the default bucket.
+    config : TransferConfig, optional
+        Multipart transfer settings, e.g. ``LARGE_FILE_TRANSFER`` for very
+        large files. If None, boto3's defaults are used.
     """
     s3, default_bucket = get_s3_client()
     bucket = bucket or default_bucket
@@ -65,12 +102,15 @@ def upload_file(
     # Convert to Path object if needed
     local_path = Path(local_path)
     
+    # Only pass Config when given so the default call stays boto3's own
+    extra = {"Config": config} if config is not None else {}
     print(f"⤴️  Uploading {local_path.name} → {remote_key}")
     s3.upload_file(
         Filename=str(local_path),
         Bucket=bucket,
         Key=remote_key,
         ExtraArgs={"ContentType": content_type},
+        **extra,
     )
     print(f"✓ Uploaded {local_path.name} to {remote_key}")
     
@@ -110,6 +150,11 @@ def copy_s3_object(
     """
     Copy an object from one S3 location to another.
     
+    The copy runs server-side – the bytes never pass through this machine.
+    boto3's managed ``copy`` switches to parallel ``UploadPartCopy`` for
+    large objects, so merged mosaics beyond the 5 GB single ``CopyObject``
+    limit copy too.
+    
     Parameters
     ----------
     source_key : str
@@ -126,7 +171,7 @@ def copy_s3_object(
     dest_bucket = dest_bucket or default_bucket
     
     copy_source = {"Bucket": source_bucket, "Key": source_key}
-    s3.copy_object(CopySource=copy_source, Bucket=dest_bucket, Key=dest_key)
+    s3.copy(copy_source, dest_bucket, dest_key)
     print(f"✓ Copied {source_key} to {dest_key}")
 
 def delete_s3_object(key: str, bucket: Optional[str] = None) -> None:
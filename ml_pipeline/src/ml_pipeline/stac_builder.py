@@ -18,7 +18,7 @@ import json
 import tempfile
 import subprocess
 from typing import Iterable, Sequence
-from contextlib import contextmanager
+from contextlib import closing, contextmanager
 
 import boto3
 import psycopg2
@@ -152,7 +152,11 @@ class STACManager:
     # ------------------------------------------------------------------
     
     def get_db_connection(self):
-        """Get a PostgreSQL database connection."""
+        """Get a new PostgreSQL database connection.
+
+        The caller owns it: ``with conn:`` only scopes a transaction, so wrap
+        it in ``closing()`` (or use db_transaction) to release the backend.
+        """
         try:
             return psycopg2.connect(
                 host=self.cfg.pg_env_vars["PGHOST"],
@@ -185,7 +189,7 @@ class STACManager:
     def test_connection(self) -> bool:
         """Test database connection and return True if successful."""
         try:
-            with self.get_db_connection() as conn:
+            with closing(self.get_db_connection()) as conn, conn:
                 with conn.cursor() as cur:
                     cur.execute("SELECT 1")
                     return cur.fetchone()[0] == 1
@@ -208,7 +212,7 @@ class STACManager:
             List of active locks
         """
         try:
-            with self.get_db_connection() as conn:
+            with closing(self.get_db_connection()) as conn, conn:
                 with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
                     if collection_id:
                         # Check for locks on specific collection
@@ -263,7 +267,7 @@ class STACManager:
             List of collection info dictionaries with id and item count
         """
         try:
-            with self.get_db_connection() as conn:
+            with closing(self.get_db_connection()) as conn, conn:
                 with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
                     cur.execute("""
                         SELECT 
@@ -296,7 +300,7 @@ class STACManager:
             Collection information or None if not found
         """
         try:
-            with self.get_db_connection() as conn:
+            with closing(self.get_db_connection()) as conn, conn:
                 with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
                     cur.execute("""
                         SELECT 
@@ -333,7 +337,7 @@ class STACManager:
             True if collection exists, False otherwise
         """
         try:
-            with self.get_db_connection() as conn:
+            with closing(self.get_db_connection()) as conn, conn:
                 with conn.cursor() as cur:
                     cur.execute(
                         "SELECT 1 FROM pgstac.collections WHERE id = %s",
@@ -444,7 +448,7 @@ class STACManager:
             import time
             start_time = time.time()
             
-            with self.get_db_connection() as conn:
+            with closing(self.get_db_connection()) as conn:
                 conn.autocommit = True  # Use autocommit for faster operations
                 with conn.cursor() as cur:
                     # Set high timeout for partition cleanup
@@ -776,6 +780,7 @@ class STACManager:
         *,
         extra_asset_fields: dict | None = None,
         derived_from_tpl: str | None = None,
+        cogs: list[dict] | None = None,
     ) -> None:
         """
         Process annual data and create STAC collection/items.
@@ -798,12 +803,19 @@ class STACManager:
             Additional fields to add to the asset
         derived_from_tpl : str | None, optional
             Template for the derived_from link
+        cogs : list[dict] | None, optional
+            Explicit COGs (``{"key", "url"}`` dicts, as from ``list_cogs``)
+            to build items for. Skips listing *prefix_on_s3*, which is then
+            only used for messages.
         """
         year_str = str(year)
         s3_prefix = f"{prefix_on_s3}/{year_str}"
 
-        cogs = self.list_cogs(s3_prefix)
-        print(f"🔍 Found {len(cogs)} COGs under {s3_prefix}")
+        if cogs is None:
+            cogs = self.list_cogs(s3_prefix)
+            print(f"🔍 Found {len(cogs)} COGs under {s3_prefix}")
+        else:
+            print(f"🔍 Using {len(cogs)} given COGs")
 
         if len(cogs) == 0:
             raise ValueError(f"No COGs found for {collection_id} in {year_str}")
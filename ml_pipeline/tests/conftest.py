@@ -18,6 +18,26 @@ import tempfile
 import json
 
 
+@pytest.fixture(autouse=True)
+def clear_benchmark_caches():
+    """Polygons, COG listings and held-out CSVs are cached per process, so reset them around every test."""
+    from ml_pipeline.benchmark_tester import BenchmarkTester
+
+    BenchmarkTester.clear_caches()
+    yield
+    BenchmarkTester.clear_caches()
+
+
+@pytest.fixture(autouse=True)
+def clear_s3_clients():
+    """S3 clients are cached per thread, so tests always start from a fresh cache."""
+    from ml_pipeline import s3_utils
+
+    s3_utils._clients.__dict__.clear()
+    yield
+    s3_utils._clients.__dict__.clear()
+
+
 @pytest.fixture
 def sample_project_id():
     """Sample project ID for testing."""
@@ -83,6 +103,22 @@ def sample_training_polygons():
     return gdf
 
 
+@pytest.fixture
+def polygons_by_month(sample_training_polygons):
+    """Side effect for a mocked load_training_polygons.
+
+    Returns the sample polygons once for every requested basemap date, tagged
+    with a ``basemap_date`` column like the real multi-month query.
+    """
+    def _load(engine, project_id, basemap_date=None, basemap_dates=None, **kwargs):
+        dates = basemap_dates if basemap_dates is not None else [basemap_date]
+        return pd.concat(
+            [sample_training_polygons.assign(basemap_date=d) for d in dates],
+            ignore_index=True,
+        )
+    return _load
+
+
 @pytest.fixture
 def sample_pixel_data():
     """Create sample pixel data for testing."""
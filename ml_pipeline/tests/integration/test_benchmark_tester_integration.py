@@ -98,7 +98,7 @@ class TestBenchmarkTesterWithMockServices:
     just with mocked data sources.
     """
     
-    def test_complete_workflow_single_month(self, benchmark_tester_params, mock_engine, sample_training_polygons):
+    def test_complete_workflow_single_month(self, benchmark_tester_params, mock_engine, polygons_by_month):
         """
         Test the complete workflow for a single month with realistic data.
         
@@ -111,31 +111,36 @@ class TestBenchmarkTesterWithMockServices:
         
         with patch('ml_pipeline.benchmark_tester.TitilerExtractor') as mock_extractor_class, \
              patch('ml_pipeline.benchmark_tester.load_training_polygons') as mock_load_polygons, \
-             patch('ml_pipeline.benchmark_tester.extract_pixels_with_missing') as mock_extract, \
+             patch('ml_pipeline.benchmark_tester.extract_cog_group') as mock_extract, \
              patch('ml_pipeline.benchmark_tester.save_metrics_csv') as mock_save, \
              patch('ml_pipeline.benchmark_tester.show_accuracy_table') as mock_show:
             
             # Setup mocks
             mock_extractor_instance = Mock()
             mock_extractor_instance.get_all_cog_urls.return_value = ['http://example.com/test.tif']
+            mock_extractor_instance.get_cog_urls.return_value = ['http://example.com/test.tif']
             mock_extractor_class.return_value = mock_extractor_instance
             
             # Return training polygons for each month (BenchmarkTester loops through all 12 months)
-            mock_load_polygons.return_value = sample_training_polygons
+            mock_load_polygons.side_effect = polygons_by_month
             
             # Mock pixel extraction to return realistic data
             # Simulate extracting different pixels for each polygon
-            def mock_extract_side_effect(extractor, geometry, band_indexes, verbose=False):
+            def mock_extract_one(geometry):
                 # Return different pixel patterns for different polygons
                 if hasattr(geometry, 'bounds'):
                     bounds = geometry.bounds
                     if bounds[0] < -79.8:  # First polygon
-                        return (np.array([[1, 1, 1, 0]]), 1, 5)  # Mostly forest
+                        return (np.array([[1], [1], [1], [0]]), 1)  # Mostly forest
                     elif bounds[0] < -79.7:  # Second polygon  
-                        return (np.array([[0, 0, 1, 0]]), 0, 4)  # Mostly non-forest
+                        return (np.array([[0], [0], [1], [0]]), 0)  # Mostly non-forest
                     else:  # Third polygon
-                        return (np.array([[1, 0, 1, 1]]), 2, 6)  # Mixed with missing data
-                return (np.array([[1, 0]]), 0, 2)
+                        return (np.array([[1], [0], [1], [1]]), 2)  # Mixed with missing data
+                return (np.array([[1], [0]]), 0)
+
+            def mock_extract_side_effect(cog, geometries, band_indexes, **kwargs):
+                # One (pixels, missing_px) entry per polygon in the COG group
+                return [mock_extract_one(geometry) for geometry in geometries]
             
             mock_extract.side_effect = mock_extract_side_effect
             
@@ -0,0 +1,165 @@
+"""
+Unit tests for CompositeGenerator's array kernels.
+
+The forest-flag algorithms and the observation cache replaced per-pixel
+Python loops with whole-array NumPy. These tests pin their output on small
+fixed arrays against the behaviour they replaced. The sieve is tested in
+test_raster_utils_unit.py.
+"""
+import os
+import pytest
+import numpy as np
+import xarray as xr
+from unittest.mock import patch
+
+# composite_generator needs the GDAL bindings (and pystac via stac_builder)
+pytest.importorskip("osgeo.gdal")
+pytest.importorskip("pystac")
+
+from ml_pipeline.composite_generator import CompositeGenerator
+
+
+# ---------------------------------------------------------------------
+# Forest-flag algorithms
+# ---------------------------------------------------------------------
+# Monthly prediction codes per pixel: 0 forest, 1 non-forest, 4 water,
+# 2/3/5/6 cloud, shadow, haze, sensor error and N no data
+N = 255
+SERIES = [
+    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+    [1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1],
+    [0, 0, 0, 0, 0, 0, 1, 1, 1, 1, 1, 1],   # deforestation
+    [1, 1, 1, 1, 0, 0, 0, 0, 0, 0, 0, 0],   # reforestation
+    [0, 0, 0, 1, 1, 0, 1, 0, 1, 0, 1, 4],
+    [0, 1, 0, 1, 0, 1, 0, 1, 0, 1, 2, 3],   # alternating, ties
+    [0, 1, 0, 2, 3, 5, 6, N, N, N, N, 1],
+    [2, 3, 5, 6, N, N, N, N, N, N, 2, 0],   # one clear observation
+    [N, N, N, N, N, N, N, N, N, N, N, N],   # no data at all
+    [4, 4, 4, 1, 0, 0, 4, 2, 1, 0, 4, 1],   # water majority
+    [1, 0, 1, 1, 0, 1, 0, 0, 1, 0, 0, 1],
+    [0, 0, 1, 2, 2, 1, 0, 1, 0, 0, 1, 0],
+    [1, 1, 0, N, 1, 0, 0, 1, 1, 0, 0, 4],
+    [0, 4, 0, 4, 1, 1, 0, 0, 4, 4, 0, 1],
+    [0, 0, 1, 1, 1, 0, 0, 0, 1, 1, 0, 0],
+    [1, 0, 0, 2, N, 4, 4, 0, 4, 1, 1, 0],
+]
+
+# Flags of the original per-pixel (apply_ufunc) implementations for SERIES,
+# with no data counted as an invalid observation
+EXPECTED_FLAGS = {
+    'majority_vote':     [1, 0, 1, 1, 1, 1, 1, 255, 255, 0, 1, 1, 1, 1, 1, 1],
+    'temporal_trend':    [1, 0, 0, 1, 0, 1, 1, 255, 255, 0, 0, 0, 0, 1, 1, 1],
+    'change_point':      [1, 0, 0, 1, 0, 0, 0, 255, 255, 0, 1, 0, 1, 0, 0, 0],
+    'latest_valid':      [1, 0, 0, 1, 0, 0, 0, 1, 255, 0, 0, 1, 0, 0, 1, 1],
+    'weighted_temporal': [1, 0, 0, 1, 0, 0, 0, 255, 255, 0, 1, 1, 1, 1, 1, 1],
+}
+
+
+@pytest.fixture
+def stacked():
+    """SERIES as a (time, band, y, x) uint8 stack on a 4x4 EPSG:3857 grid."""
+    cube = np.array(SERIES, dtype=np.uint8).T.reshape(12, 1, 4, 4)
+    stack = xr.DataArray(
+        cube,
+        coords={
+            "time": [f"{m:02d}" for m in range(1, 13)],
+            "band": [1],
+            "y": 995.0 - 10.0 * np.arange(4),
+            "x": 5.0 + 10.0 * np.arange(4),
+        },
+        dims=("time", "band", "y", "x"),
+    )
+    return stack.rio.write_crs("EPSG:3857")
+
+
+@pytest.fixture
+def generator(tmp_path):
+    return CompositeGenerator("test-run", "2022", root=tmp_path)
+
+
+class TestForestFlagAlgorithms:
+    """Test the vectorised algorithms against the per-pixel results."""
+
+    @pytest.mark.parametrize("algorithm", list(EXPECTED_FLAGS))
+    def test_algorithm_matches_per_pixel_result(self, generator, stacked, algorithm):
+        flag = generator._generate_forest_flag(stacked, algorithm)
+
+        assert flag.dtype == np.uint8
+        assert flag.values.ravel().tolist() == EXPECTED_FLAGS[algorithm]
+
+    def test_float_stack_with_nan_no_data(self, generator, stacked):
+        """Masked reads (float, NaN no data) give the same flags as the uint8 stack."""
+        masked = stacked.astype(float).where(stacked != 255)
+
+        flags = generator._generate_forest_flags(masked, list(EXPECTED_FLAGS))
+
+        for algorithm, expected in EXPECTED_FLAGS.items():
+            assert flags[algorithm].values.ravel().tolist() == expected, algorithm
+
+    def test_strips_give_the_same_flags(self, generator, stacked):
+        generator.STRIP_ROWS = 1
+
+        flags = generator._generate_forest_flags(stacked, list(EXPECTED_FLAGS))
+
+        for algorithm, expected in EXPECTED_FLAGS.items():
+            assert flags[algorithm].values.ravel().tolist() == expected, algorithm
+
+    def test_unknown_algorithm_raises(self, generator, stacked):
+        with pytest.raises(ValueError, match="Unknown algorithm"):
+            generator._generate_forest_flag(stacked, "random_forest")
+
+
+# ---------------------------------------------------------------------
+# Observation cache
+# ---------------------------------------------------------------------
+class TestObservationCache:
+    """Test that cached observation counts round-trip and are tallied once."""
+
+    def test_cache_round_trip(self, generator, stacked, tmp_path):
+        cache_path = tmp_path / "cache" / "q_2022_observations.npz"
+        stacked = stacked.rio.write_transform(stacked.rio.transform())
+
+        tally, valid = generator._save_observation_cache(cache_path, stacked)
+        loaded_tally, loaded_valid = generator._load_observation_cache(cache_path)
+
+        np.testing.assert_array_equal(loaded_tally, tally)
+        np.testing.assert_array_equal(loaded_valid.values, valid.values)
+        assert loaded_valid.rio.crs == stacked.rio.crs
+        assert loaded_valid.rio.transform() == stacked.rio.transform()
+        flag = generator._majority_vote_algorithm(None, loaded_valid, loaded_tally)
+        assert flag.values.ravel().tolist() == EXPECTED_FLAGS['majority_vote']
+
+    def test_cache_older_than_local_predictions_is_ignored(self, generator, stacked, tmp_path):
+        cache_path = tmp_path / "cache" / "q_2022_observations.npz"
+        generator._save_observation_cache(cache_path, stacked)
+        cog = tmp_path / "q_2022_01.tiff"
+        cog.write_bytes(b"")
+        mtime = cache_path.stat().st_mtime + 10
+        os.utime(cog, (mtime, mtime))
+
+        assert generator._load_observation_cache(cache_path, [str(cog)]) is None
+
+    @pytest.mark.parametrize("algorithm, cached", [('majority_vote', True), ('temporal_trend', False)])
+    def test_generate_composite_tallies_once_and_caches_majority_vote_only(
+        self, generator, stacked, tmp_path, algorithm, cached
+    ):
+        from ml_pipeline import composite_generator
+
+        cache_path = generator.run_path / "cache" / "q_2022_observations.npz"
+        with generator, \
+             patch.object(generator, '_stack_monthly_data', return_value=stacked) as mock_stack, \
+             patch.object(generator, '_create_output_files', return_value=(None, tmp_path / "q.tif")) as mock_output, \
+             patch.object(composite_generator, '_tally_observations',
+                          wraps=composite_generator._tally_observations) as mock_tally:
+            generator.generate_composite("q", skip_s3_upload=True, algorithm=algorithm, cache_observations=True)
+
+            assert mock_tally.call_count == (1 if algorithm == 'majority_vote' else 0)
+            assert cache_path.exists() is cached
+            flag = mock_output.call_args.args[1]
+            assert flag.values.ravel().tolist() == EXPECTED_FLAGS[algorithm]
+
+            # A re-run of the majority vote is served from the cache
+            if cached:
+                generator.generate_composite("q", skip_s3_upload=True, algorithm=algorithm, cache_observations=True)
+                assert mock_stack.call_count == 1
+                assert mock_output.call_args.args[1].values.ravel().tolist() == EXPECTED_FLAGS[algorithm]
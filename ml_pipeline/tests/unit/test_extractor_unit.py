@@ -0,0 +1,170 @@
+"""
+Unit tests for TitilerExtractor.
+
+COG lookups go through an in-memory STRtree of the quad footprints and pixels
+are read with windowed reads + geometry_mask on a thread pool. The footprint
+query is mocked, and the results are compared with the per-polygon SQL
+lookup and rasterio.mask.mask extraction they replaced.
+"""
+import pytest
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import rasterio
+from concurrent.futures import ThreadPoolExecutor
+from rasterio.mask import mask
+from rasterio.transform import from_origin
+from rasterio.warp import transform, transform_bounds
+from shapely.geometry import Polygon, box, mapping
+from unittest.mock import patch
+
+from ml_pipeline.extractor import TitilerExtractor, _enter_read_env
+
+
+@pytest.fixture
+def quads(tmp_path):
+    """Three 2-band uint16 quads (nodata=0): two overlapping, one far away."""
+    rng = np.random.default_rng(0)
+    x0, y0 = transform("EPSG:4326", "EPSG:3857", [-79.85], [-0.75])
+    specs = {
+        "a": ("EPSG:4326", from_origin(-80.0, -0.8, 0.01, 0.01)),
+        "b": ("EPSG:3857", from_origin(x0[0], y0[0], 1113.0, 1113.0)),
+        "far": ("EPSG:4326", from_origin(-70.0, 5.2, 0.01, 0.01)),
+    }
+    paths = {}
+    for name, (crs, affine) in specs.items():
+        data = rng.integers(1, 1000, (2, 20, 20), dtype=np.uint16)
+        data[:, 8:11, 14:17] = 0     # nodata in every band ➜ dropped
+        data[0, 12, 15] = 0          # nodata in one band only ➜ kept
+        path = tmp_path / f"{name}.tif"
+        with rasterio.open(
+            path, "w", driver="GTiff", width=20, height=20, count=2, dtype="uint16",
+            crs=crs, transform=affine, nodata=0,
+        ) as dst:
+            dst.write(data)
+        paths[name] = str(path)
+    return paths
+
+
+@pytest.fixture
+def footprints(quads):
+    """pgSTAC rows (href, WKB footprint in EPSG:4326), deliberately not in name order."""
+    rows = []
+    for name in ("far", "b", "a"):
+        with rasterio.open(quads[name]) as src:
+            rows.append((quads[name], box(*transform_bounds(src.crs, "EPSG:4326", *src.bounds)).wkb))
+    return pd.DataFrame(rows, columns=["href", "footprint"])
+
+
+@pytest.fixture
+def extractor(footprints):
+    with patch('ml_pipeline.extractor.get_db_connection'), \
+         patch('ml_pipeline.extractor.pd.read_sql', return_value=footprints) as mock_read_sql:
+        ext = TitilerExtractor("test-collection", [1, 2])
+        ext.mock_read_sql = mock_read_sql
+        yield ext
+
+
+@pytest.fixture
+def training_polygons():
+    return gpd.GeoDataFrame(
+        {"id": [11, 12, 13, 14], "classLabel": ["Forest", "Non-Forest", "Forest", "Water"]},
+        geometry=[
+            box(-79.95, -0.95, -79.90, -0.90),                                    # a only
+            box(-79.84, -0.90, -79.78, -0.84),                                    # a and b
+            Polygon([(-79.75, -0.80), (-79.70, -0.80), (-79.72, -0.86)]),         # b only
+            box(-60.0, 10.0, -59.9, 10.1),                                        # no quad
+        ],
+        crs="EPSG:4326",
+    )
+
+
+def _sql_lookup(footprints, polygon):
+    """What the per-polygon ST_Intersects query returned: intersecting rows in table order."""
+    return [
+        href for href, wkb in zip(footprints["href"], footprints["footprint"])
+        if polygon.intersects(gpd.GeoSeries.from_wkb([wkb]).iloc[0])
+    ]
+
+
+def _mask_reference(gdf, lookup, band_indexes):
+    """What extract_pixels returned before: rasterio.mask.mask per polygon and COG."""
+    wgs84, webm = gdf.to_crs("EPSG:4326"), gdf.to_crs("EPSG:3857")
+    pixels, labels, fids = [], [], []
+    for i, (g4326, g3857, fid, label) in enumerate(
+        zip(wgs84.geometry, webm.geometry, gdf["id"], gdf["classLabel"])
+    ):
+        for cog in lookup[i]:
+            with rasterio.open(cog) as src:
+                geom = g4326 if src.crs.to_epsg() == 4326 else g3857
+                out, _ = mask(src, [mapping(geom)], crop=True, indexes=band_indexes, all_touched=True)
+                arr = np.moveaxis(out, 0, -1).reshape(-1, len(band_indexes))
+                arr = arr[~np.all(arr == src.nodata, axis=1)]
+            pixels.append(arr)
+            labels.extend([label] * len(arr))
+            fids.extend([fid] * len(arr))
+    return np.vstack(pixels), np.array(labels), np.array(fids)
+
+
+class TestCogLookup:
+    """Test the footprint STRtree against the per-polygon SQL lookup."""
+
+    def test_bulk_lookup_matches_per_polygon_lookup(self, extractor, footprints, quads, training_polygons):
+        polygons = list(training_polygons.geometry)
+
+        bulk = extractor.get_cog_urls_bulk(polygons)
+
+        assert bulk == {i: _sql_lookup(footprints, p) for i, p in enumerate(polygons)}
+        assert bulk[1] == [quads["b"], quads["a"]]   # table order, not name order
+        assert bulk[3] == []
+        assert [extractor.get_cog_urls(p) for p in polygons] == [bulk[i] for i in range(len(polygons))]
+        # Footprints are loaded once per collection
+        assert extractor.mock_read_sql.call_count == 1
+
+
+class TestExtractPixels:
+    """Test windowed extraction against rasterio.mask.mask."""
+
+    @pytest.mark.parametrize("crs", ["EPSG:4326", "EPSG:3857"])
+    def test_extract_pixels_matches_mask_extraction(self, extractor, footprints, training_polygons, crs):
+        gdf = training_polygons.to_crs(crs)
+        lookup = [_sql_lookup(footprints, p) for p in training_polygons.geometry]
+
+        X, y, fid = extractor.extract_pixels(gdf, max_workers=4)
+        X_ref, y_ref, fid_ref = _mask_reference(gdf, lookup, [1, 2])
+
+        assert X.dtype == X_ref.dtype == np.uint16
+        np.testing.assert_array_equal(X, X_ref)
+        np.testing.assert_array_equal(y, y_ref)
+        np.testing.assert_array_equal(fid, fid_ref)
+        assert set(fid) == {11, 12, 13}
+
+    def test_unreadable_cog_is_skipped(self, footprints, training_polygons):
+        broken = pd.concat(
+            [footprints, pd.DataFrame({"href": ["/nonexistent/quad.tif"], "footprint": [box(-80, -1, -79, 0).wkb]})],
+            ignore_index=True,
+        )
+        with patch('ml_pipeline.extractor.get_db_connection'), \
+             patch('ml_pipeline.extractor.pd.read_sql', return_value=broken):
+            X, y, fid = TitilerExtractor("test-collection", [1, 2]).extract_pixels(training_polygons)
+        lookup = [_sql_lookup(footprints, p) for p in training_polygons.geometry]
+
+        np.testing.assert_array_equal(X, _mask_reference(training_polygons, lookup, [1, 2])[0])
+
+    def test_no_pixels_raises(self, extractor, training_polygons):
+        with pytest.raises(RuntimeError, match="No valid pixels"):
+            extractor.extract_pixels(training_polygons.iloc[[3]])
+
+
+class TestReadEnv:
+    """Test that the COG read env is entered per worker thread only."""
+
+    def test_workers_use_cog_read_env_and_caller_is_untouched(self, extractor, training_polygons):
+        def worker_option(_):
+            return rasterio.env.getenv().get("GDAL_HTTP_MULTIPLEX")
+
+        with ThreadPoolExecutor(max_workers=2, initializer=_enter_read_env) as pool:
+            assert list(pool.map(worker_option, range(4))) == ["YES"] * 4
+
+        extractor.extract_pixels(training_polygons, max_workers=2)
+        assert not rasterio.env.hasenv()
@@ -0,0 +1,120 @@
+"""
+Unit tests for the raster_utils array helpers.
+
+sieve_flag replaced gdal.SieveFilter on the in-memory forest flag. The
+expected arrays below are what gdal.SieveFilter produces; the same cases are
+also run against GDAL itself where the bindings are installed.
+"""
+import pytest
+import numpy as np
+
+from ml_pipeline.raster_utils import sieve_flag
+
+
+def _flag(shape, fill, *patches):
+    """uint8 flag of *fill* with (slice, value) patches written in order."""
+    flag = np.full(shape, fill, dtype=np.uint8)
+    for index, value in patches:
+        flag[index] = value
+    return flag
+
+
+# (flag, min_pixels, expected) – expected is the gdal.SieveFilter output
+SIEVE_CASES = {
+    # 4 px island ➜ 1, 25 px block is kept, 1 px no-data corner takes part too ➜ 1
+    "small_regions_merge": (
+        _flag((20, 20), 1, (np.s_[2:4, 2:4], 0), (np.s_[10:15, 10:15], 0), (np.s_[0, 19], 255)),
+        10,
+        _flag((20, 20), 1, (np.s_[10:15, 10:15], 0)),
+    ),
+    # A region of exactly min_pixels (10 px) is kept
+    "threshold_exact": (
+        _flag((12, 12), 1, (np.s_[3:5, 3:8], 0)),
+        10,
+        _flag((12, 12), 1, (np.s_[3:5, 3:8], 0)),
+    ),
+    "threshold_above": (
+        _flag((12, 12), 1, (np.s_[3:5, 3:8], 0)),
+        11,
+        _flag((12, 12), 1),
+    ),
+    # 4 px block touching the 0 region (146 px) and the 255 region (150 px)
+    "largest_neighbour": (
+        _flag((10, 30), 0, (np.s_[:, 15:], 255), (np.s_[4:6, 13:15], 1)),
+        10,
+        _flag((10, 30), 0, (np.s_[:, 15:], 255), (np.s_[4:6, 13:15], 255)),
+    ),
+    # One 12 px diagonal with 8-connectedness
+    "diagonal_kept": (
+        _flag((12, 12), 1, (np.eye(12, dtype=bool), 0)),
+        10,
+        _flag((12, 12), 1, (np.eye(12, dtype=bool), 0)),
+    ),
+    "diagonal_removed": (
+        _flag((12, 12), 1, (np.eye(12, dtype=bool), 0)),
+        13,
+        _flag((12, 12), 1),
+    ),
+    # 8 px ring around a 1 px hole, both below the threshold
+    "nested": (
+        _flag((30, 30), 0, (np.s_[10:13, 10:13], 1), (np.s_[11, 11], 255)),
+        10,
+        _flag((30, 30), 0),
+    ),
+    # 8 px corner patch whose largest neighbour is a 7 px sliver: the chain
+    # runs through the sliver to the background
+    "chain_through_smaller_neighbour": (
+        _flag((12, 12), 0, (np.s_[0:2, 0:4], 1), (np.s_[2, 0:5], 255), (np.s_[0:2, 4], 255)),
+        10,
+        _flag((12, 12), 0),
+    ),
+    # Two small regions that are each other's largest neighbour form a cycle
+    # and are left unchanged
+    "cycle": (
+        _flag((1, 9), 0, (np.s_[0, 4:], 1)),
+        10,
+        _flag((1, 9), 0, (np.s_[0, 4:], 1)),
+    ),
+    "nothing_below_threshold": (
+        _flag((8, 8), 0, (np.s_[:, 4:], 1)),
+        10,
+        _flag((8, 8), 0, (np.s_[:, 4:], 1)),
+    ),
+}
+
+
+def _gdal_sieve(flag, min_pixels):
+    """Reference: gdal.SieveFilter as the generator used to call it (8-connected, no mask band)."""
+    gdal = pytest.importorskip("osgeo.gdal")
+    ds = gdal.GetDriverByName("MEM").Create("", flag.shape[1], flag.shape[0], 1, gdal.GDT_Byte)
+    band = ds.GetRasterBand(1)
+    band.WriteArray(flag)
+    gdal.SieveFilter(srcBand=band, maskBand=None, dstBand=band, threshold=min_pixels, connectedness=8)
+    return band.ReadAsArray()
+
+
+class TestSieve:
+    """Test sieve_flag's connectivity, threshold and neighbour-chain rules."""
+
+    @pytest.mark.parametrize("case", list(SIEVE_CASES))
+    def test_sieve_matches_expected(self, case):
+        flag, min_pixels, expected = SIEVE_CASES[case]
+
+        out = sieve_flag(flag.copy(), min_pixels)
+
+        assert out.dtype == np.uint8
+        np.testing.assert_array_equal(out, expected)
+
+    @pytest.mark.parametrize("case", list(SIEVE_CASES))
+    def test_expected_matches_gdal(self, case):
+        flag, min_pixels, expected = SIEVE_CASES[case]
+
+        np.testing.assert_array_equal(_gdal_sieve(flag, min_pixels), expected)
+
+    def test_input_is_not_modified(self):
+        flag, min_pixels, _ = SIEVE_CASES["small_regions_merge"]
+        before = flag.copy()
+
+        sieve_flag(flag, min_pixels)
+
+        np.testing.assert_array_equal(flag, before)
@@ -9,7 +9,7 @@ from pathlib import Path
 from unittest.mock import Mock, patch, mock_open
 import tempfile
 
-from ml_pipeline.s3_utils import upload_file, get_s3_client, list_files, download_file
+from ml_pipeline.s3_utils import upload_file, get_s3_client, list_files, download_file, LARGE_FILE_TRANSFER
 
 
 class TestS3ClientCreation:
@@ -66,6 +66,35 @@ class TestS3ClientCreation:
             assert client == mock_client
             assert bucket == "custom-bucket"
 
+    def test_get_s3_client_reuses_client_per_thread(self):
+        """Test that the client is built once per thread and then reused."""
+        import threading
+
+        with patch('ml_pipeline.s3_utils.boto3.session.Session') as mock_session, \
+             patch('ml_pipeline.s3_utils.load_dotenv'), \
+             patch('ml_pipeline.s3_utils.os.getenv') as mock_getenv:
+            
+            mock_getenv.side_effect = lambda key: {
+                'AWS_REGION': 'eu-central-1',
+                'AWS_S3_ENDPOINT': 'reuse.endpoint.com',
+                'AWS_ACCESS_KEY_ID': 'reuse_key',
+                'AWS_SECRET_ACCESS_KEY': 'reuse_secret'
+            }.get(key)
+            mock_session.return_value.client.side_effect = lambda *args, **kwargs: Mock()
+            
+            first, _ = get_s3_client()
+            second, _ = get_s3_client("other-bucket")
+            
+            other_thread = {}
+            worker = threading.Thread(target=lambda: other_thread.update(client=get_s3_client()[0]))
+            worker.start()
+            worker.join()
+            
+            # Same thread reuses its client; another thread gets its own
+            assert first is second
+            assert other_thread['client'] is not first
+            assert mock_session.return_value.client.call_count == 2
+
 
 class TestS3FileUpload:
     """Test S3 file upload functionality used by Predictor."""
@@ -146,6 +175,29 @@ class TestS3FileUpload:
         finally:
             test_file.unlink()
 
+    def test_upload_file_with_transfer_config(self):
+        """Test that a transfer config is forwarded to the managed upload."""
+        with tempfile.NamedTemporaryFile(suffix='.tif', delete=False) as f:
+            test_file = Path(f.name)
+            f.write(b"merged mosaic")
+        
+        try:
+            with patch('ml_pipeline.s3_utils.get_s3_client') as mock_get_s3:
+                mock_client = Mock()
+                mock_get_s3.return_value = (mock_client, "test-bucket")
+                
+                upload_file(test_file, "datasets/merged.tif", config=LARGE_FILE_TRANSFER)
+                
+                mock_client.upload_file.assert_called_once_with(
+                    Filename=str(test_file),
+                    Bucket="test-bucket",
+                    Key="datasets/merged.tif",
+                    ExtraArgs={"ContentType": "image/tiff"},
+                    Config=LARGE_FILE_TRANSFER,
+                )
+        finally:
+            test_file.unlink()
+
     def test_upload_file_handles_s3_errors(self):
         """Test that upload_file handles S3 errors gracefully."""
         with tempfile.NamedTemporaryFile(suffix='.tiff', delete=False) as f: